@@ -0,0 +1,127 @@
+"""Decode many WAV files in parallel, one file per task, and write a manifest.
+
+python batch.py captures/ more/*.wav -o decoded/ -j 8
+"""
+import argparse
+import concurrent.futures
+import glob
+import json
+import os
+import time
+
+import numpy as np
+
+from formats import write_bitstream
+from wave_helpers import run_stages
+from instrument import StageStats
+
+
+def find_wav_files(inputs: list, pattern: str = '*.wav') -> list:
+    """Expand directories and glob patterns to a sorted list of files, without duplicates.
+
+    :param inputs: Directory names, file names, or glob patterns
+    :param pattern: Glob pattern for files inside directories. Use '**/*.wav' to recurse.
+    :return: List of file names
+    """
+    found = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            found.update(glob.glob(os.path.join(item, pattern), recursive=True))
+        else:
+            found.update(glob.glob(item, recursive=True))
+    return sorted(f for f in found if os.path.isfile(f))
+
+
+def decode_file(infile: str, outdir: str, **pipeline_args) -> dict:
+    """Decode one WAV file and save its bits. Never raises, so that one bad file cannot stop a batch.
+
+    :param infile: Name of input WAV file
+    :param outdir: Directory for the output .fsk file, see formats.write_bitstream()
+    :param pipeline_args: Passed on to run_stages()
+    :return: Manifest record, with 'error' set to a message instead if decoding failed. 'stages' holds the time and
+        sizes of each pipeline stage, see StageStats.
+    """
+    record = {'infile': infile, 'outfile': None, 'error': None}
+    stats = StageStats()
+    t0 = time.perf_counter()
+    cpu0 = time.process_time()
+    try:
+        w, f, b = run_stages(infile, stats=stats, **pipeline_args)
+        outfile = os.path.join(outdir, os.path.splitext(os.path.basename(infile))[0] + '.fsk')
+        record.update(outfile=outfile, n_samples=int(w.n_samples_actually_read), n_bits=len(b.stream),
+                      n_undecided=int(np.count_nonzero((b.stream != 0) & (b.stream != 1))),
+                      mark_bin=int(b.high), space_bin=int(b.low),
+                      mark_hz=float(f.bin_f[b.high]), space_hz=float(f.bin_f[b.low]))
+        write_bitstream(outfile, b.stream, infile=infile, mark_hz=record['mark_hz'], space_hz=record['space_hz'])
+    except Exception as e:  # corrupt, truncated, silent, or otherwise undecodable files
+        record['error'] = '%s: %s' % (type(e).__name__, e)
+    record['seconds'] = time.perf_counter() - t0
+    record['cpu_seconds'] = time.process_time() - cpu0
+    record['stages'] = stats.records
+    return record
+
+
+def run_batch(infiles: list, outdir: str, manifest: str = None, n_workers: int = None, **pipeline_args) -> list:
+    """Decode files across a pool of processes. Each worker imports NumPy/SciPy once and then decodes many files.
+
+    Throughput against worker count is measured by bench_batch.py.
+
+    :param infiles: Names of input WAV files
+    :param outdir: Directory for output .fsk files (created if needed)
+    :param manifest: Name of JSON lines manifest file, one record per input file. Default is manifest.jsonl in outdir.
+    :param n_workers: Number of worker processes. `None` means one per CPU.
+    :param pipeline_args: Passed on to run_stages(), e.g. baud=50, detector='goertzel'
+    :return: List of manifest records, in completion order.
+    :raises: ValueError if two input files have the same base name
+    """
+    stems = [os.path.splitext(os.path.basename(f))[0] for f in infiles]
+    if len(set(stems)) != len(stems):
+        raise ValueError("Input files must have distinct names, since outputs all go in one directory")
+    os.makedirs(outdir, exist_ok=True)
+    if manifest is None:
+        manifest = os.path.join(outdir, 'manifest.jsonl')
+    records = []
+    with open(manifest, 'w') as manifest_fh, \
+            concurrent.futures.ProcessPoolExecutor(max_workers=n_workers) as pool:
+        futures = {pool.submit(decode_file, infile, outdir, **pipeline_args): infile for infile in infiles}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                record = future.result()
+            except Exception as e:  # the worker process itself died, e.g. out of memory
+                record = {'infile': futures[future], 'outfile': None, 'error': '%s: %s' % (type(e).__name__, e)}
+            records.append(record)
+            manifest_fh.write(json.dumps(record) + '\n')
+            manifest_fh.flush()
+    return records
+
+
+def main(argv: list = None) -> list:
+    parser = argparse.ArgumentParser(description="Decode many FSK WAV files to bitstreams in parallel.")
+    parser.add_argument('inputs', nargs='+', help="WAV files, directories, or glob patterns")
+    parser.add_argument('-o', '--outdir', default='decoded', help="directory for .fsk files and the manifest")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('--pattern', default='*.wav', help="glob for files inside directories, e.g. '**/*.wav'")
+    parser.add_argument('--manifest', default=None, help="manifest file name (default: OUTDIR/manifest.jsonl)")
+    parser.add_argument('--baud', type=int, default=50)
+    parser.add_argument('--seg-per-symbol', type=int, default=3)
+    parser.add_argument('--pass-lo', type=int, default=400)
+    parser.add_argument('--pass-hi', type=int, default=2000)
+    parser.add_argument('--backend', choices=['wave', 'mmap'], default='wave')
+    parser.add_argument('--detector', choices=['stft', 'goertzel'], default='stft')
+    args = parser.parse_args(argv)
+
+    infiles = find_wav_files(args.inputs, args.pattern)
+    t0 = time.perf_counter()
+    records = run_batch(infiles, args.outdir, args.manifest, args.workers, baud=args.baud,
+                        seg_per_symbol=args.seg_per_symbol, pass_lo=args.pass_lo, pass_hi=args.pass_hi,
+                        backend=args.backend, detector=args.detector)
+    n_failed = sum(1 for r in records if r['error'] is not None)
+    print("Decoded %i of %i files in %.1f s" % (len(records) - n_failed, len(records), time.perf_counter() - t0))
+    for r in records:
+        if r['error'] is not None:
+            print("  failed: %s (%s)" % (r['infile'], r['error']))
+    return records
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Measure how batch decoding of many files scales with worker count, and check it matches the serial decode.
+
+python bench_batch.py [n_files] [seconds_per_file]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from batch import run_batch
+from formats import read_bitstream
+from synthetic import make_fsk_wav
+from wave_helpers import whole_pipeline
+
+
+def main(n_files: int = 32, seconds_per_file: float = 30) -> None:
+    n_files = int(n_files)
+    tmp = tempfile.mkdtemp()
+    try:
+        infiles = [os.path.join(tmp, 'in%03i.wav' % i) for i in range(n_files)]
+        for i, infile in enumerate(infiles):
+            make_fsk_wav(infile, seconds_per_file, seed=i, noise=0.3)
+        print("%i files of %g s, %i CPUs" % (n_files, seconds_per_file, os.cpu_count()))
+
+        whole_pipeline(infiles[0], outfile=None)  # imports SciPy, as each worker does once
+        t0 = time.perf_counter()
+        serial = {os.path.basename(f): whole_pipeline(f, outfile=None) for f in infiles}
+        t_serial = time.perf_counter() - t0
+        print("  serial      %7.2f s  %6.1f files/s" % (t_serial, n_files / t_serial))
+        for n_workers in [1, 2, 4, 8]:
+            outdir = os.path.join(tmp, 'out%i' % n_workers)
+            t0 = time.perf_counter()
+            records = run_batch(infiles, outdir, n_workers=n_workers)
+            elapsed = time.perf_counter() - t0
+            identical = all(r['error'] is None and
+                            np.array_equal(read_bitstream(r['outfile'])[0], serial[os.path.basename(r['infile'])])
+                            for r in records)
+            print("  %i worker(s) %7.2f s  %6.1f files/s  speedup %4.1f x  identical: %s" %
+                  (n_workers, elapsed, n_files / elapsed, t_serial / elapsed, identical))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(*[float(a) for a in sys.argv[1:]])
@@ -0,0 +1,96 @@
+"""Compare the full-STFT tone detector (Fourier) against the matched-filter one (Goertzel).
+
+python bench_detectors.py [n_minutes]
+
+Times both on sample-data.wav and on a long copy of it, then on synthetic recordings from half a second up to
+n_minutes, since Goertzel's STFT of a 100 symbol prefix makes it slower than Fourier on short files.
+"""
+import difflib
+import os
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+from wave_helpers import WaveData, Fourier, Goertzel, Bitstream
+from synthetic import make_fsk_wav, bit_error_rate
+
+
+def time_detector(wave_data: WaveData, detector: type, repeats: int) -> tuple:
+    """Best-of-N seconds to detect tones and apply the passband, and the resulting bitstream."""
+    best = float('inf')
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        f = detector(wave_data)
+        f.apply_passband(400, 2000)
+        best = min(best, time.perf_counter() - t0)
+    return best, Bitstream(f).stream
+
+
+def compare(label: str, wave_data: WaveData, repeats: int, align: bool = True) -> None:
+    t_stft, bits_stft = time_detector(wave_data, Fourier, repeats)
+    t_goertzel, bits_goertzel = time_detector(wave_data, Goertzel, repeats)
+    print("%s: %i samples" % (label, len(wave_data.int_list)))
+    print("  stft     %9.4f s  %7i bits" % (t_stft, len(bits_stft)))
+    print("  goertzel %9.4f s  %7i bits" % (t_goertzel, len(bits_goertzel)))
+    print("  speedup  %9.1f x" % (t_stft / t_goertzel))
+    print("  identical: %s" % np.array_equal(bits_stft, bits_goertzel))
+    if align:  # quadratic time, so only for short streams
+        matcher = difflib.SequenceMatcher(None, bits_stft.tolist(), bits_goertzel.tolist(), autojunk=False)
+        n_matching = sum(block.size for block in matcher.get_matching_blocks())
+        print("  bits in common after alignment: %i of %i" % (n_matching, len(bits_stft)))
+    print()
+
+
+def sweep(durations: list, noise: float = 0.3) -> None:
+    """Time both detectors on synthetic recordings of each duration, and check their bits against what was sent.
+
+    :param durations: Lengths of recordings, in seconds
+    :param noise: Noise level, see synthetic.fsk_samples()
+    """
+    fd, name = tempfile.mkstemp(suffix='.wav')
+    os.close(fd)
+    print("%9s %9s %9s %8s %11s %11s" % ('seconds', 'stft', 'goertzel', 'speedup', 'stft BER', 'goertzel BER'))
+    try:
+        for duration in durations:
+            bits = make_fsk_wav(name, duration, seed=1, noise=noise)
+            with wave.open(name, 'r') as fh:
+                w = WaveData(fh, n_symbols_to_read=None)
+            repeats = 20 if duration < 60 else 3
+            t_stft, bits_stft = time_detector(w, Fourier, repeats)
+            t_goertzel, bits_goertzel = time_detector(w, Goertzel, repeats)
+            ber_stft, ber_goertzel = bit_error_rate(bits_stft, bits), bit_error_rate(bits_goertzel, bits)
+            print("%9g %9.4f %9.4f %8.1f %11g %11g"
+                  % (duration, t_stft, t_goertzel, t_stft / t_goertzel, ber_stft, ber_goertzel))
+    finally:
+        os.remove(name)
+    print()
+
+
+def main(n_minutes: float = 10) -> None:
+    with wave.open('sample-data.wav', 'r') as fh:
+        params = fh.getparams()
+        w = WaveData(fh, n_symbols_to_read=None)
+    compare('sample-data.wav', w, repeats=20)
+
+    # A long capture made by repeating the sample recording.
+    n_repeats = int(n_minutes * 60 * params.framerate / params.nframes) + 1
+    fd, long_name = tempfile.mkstemp(suffix='.wav')
+    os.close(fd)
+    try:
+        with wave.open(long_name, 'w') as out:
+            out.setparams(params)
+            out.writeframes(bytes(w.wav_bytes) * n_repeats)
+        with wave.open(long_name, 'r') as fh:
+            w_long = WaveData(fh, n_symbols_to_read=None)
+        compare('sample-data.wav x %i (%.1f min)' % (n_repeats, n_minutes), w_long, repeats=3, align=False)
+    finally:
+        os.remove(long_name)
+
+    sweep([d for d in (0.5, 1, 2, 5, 20, 60) if d < n_minutes * 60] + [n_minutes * 60])
+
+
+if __name__ == '__main__':
+    main(*[float(a) for a in sys.argv[1:]])
@@ -0,0 +1,45 @@
+"""Measure how intra-file parallel decoding scales with worker count, and check it matches the serial decode.
+
+python bench_parallel.py [n_minutes]
+"""
+import os
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+from wave_helpers import whole_pipeline
+from parallel import parallel_bitstream
+
+
+def main(n_minutes: float = 20) -> None:
+    with wave.open('sample-data.wav', 'r') as fh:
+        params = fh.getparams()
+        frames = fh.readframes(params.nframes)
+    n_repeats = int(n_minutes * 60 * params.framerate / params.nframes) + 1
+    fd, long_name = tempfile.mkstemp(suffix='.wav')
+    os.close(fd)
+    try:
+        with wave.open(long_name, 'w') as out:
+            out.setparams(params)
+            out.writeframes(frames * n_repeats)
+        print("%.1f min of audio, %i CPUs" % (n_minutes, os.cpu_count()))
+
+        t0 = time.perf_counter()
+        serial = whole_pipeline(long_name, outfile=None)
+        t_serial = time.perf_counter() - t0
+        print("  serial      %7.2f s" % t_serial)
+        for n_workers in [1, 2, 4, 8]:
+            t0 = time.perf_counter()
+            bits = parallel_bitstream(long_name, n_workers=n_workers, backend='mmap')
+            elapsed = time.perf_counter() - t0
+            print("  %i worker(s) %7.2f s  speedup %4.1f x  identical: %s" %
+                  (n_workers, elapsed, t_serial / elapsed, np.array_equal(bits, serial)))
+    finally:
+        os.remove(long_name)
+
+
+if __name__ == '__main__':
+    main(*[float(a) for a in sys.argv[1:]])
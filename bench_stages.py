@@ -0,0 +1,187 @@
+"""Time and memory-profile each pipeline stage on synthetic FSK of increasing length, and check the bit error rate.
+
+python bench_stages.py                                  # 1 s, 1 min, 10 min
+python bench_stages.py --durations 1 3600 10800 -o after.jsonl --compare before.jsonl
+
+Results are JSON lines, one record per (duration, stage). The in-memory pipeline needs roughly 50 bytes of RAM per
+sample, i.e. about 4 GB per hour of 22,050 Hz audio.
+"""
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import wave
+
+import numpy as np
+
+from wave_helpers import bytes2samples, run_length_to_bitstream, square_up, rle, runs_to_bits
+from wave_helpers import WaveData, Fourier, Bitstream, SoftBitstream
+from synthetic import make_fsk_wav, bit_error_rate
+
+
+def git_commit() -> str:
+    """Current commit hash, or None outside a git checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              universal_newlines=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(func, setup=lambda: None, repeats: int = 3) -> dict:
+    """Best-of-N wall and CPU time of func(setup()), then peak traced allocation in one more, separate run (tracing
+    slows things down, so it is kept out of the timings).
+
+    :param func: Stage to measure. Takes the value returned by setup.
+    :param setup: Makes a fresh input for each run, untimed
+    :param repeats: Number of timed runs
+    :return: dict of seconds, cpu_seconds, peak_bytes and the stage's return value as 'result'.
+    """
+    best_wall, best_cpu = float('inf'), float('inf')
+    for _ in range(repeats):
+        arg = setup()
+        t0, cpu0 = time.perf_counter(), time.process_time()
+        func(arg)
+        best_wall = min(best_wall, time.perf_counter() - t0)
+        best_cpu = min(best_cpu, time.process_time() - cpu0)
+    arg = setup()
+    tracemalloc.start()
+    result = func(arg)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': best_wall, 'cpu_seconds': best_cpu, 'peak_bytes': peak, 'result': result}
+
+
+def bench_file(infile: str, bits: np.ndarray, repeats: int) -> list:
+    """Measure every stage on one WAV file.
+
+    :param infile: Name of WAV file
+    :param bits: The bits it was made from
+    :param repeats: Number of timed runs per stage
+    :return: List of records, one per stage, plus one for the bit error rate of Bitstream and of SoftBitstream.
+    """
+    with wave.open(infile, 'r') as fh:
+        wav_bytes = fh.readframes(fh.getnframes())
+        sample_width = fh.getsampwidth()
+
+    def read(_):
+        with wave.open(infile, 'r') as fh:
+            return WaveData(fh, n_symbols_to_read=None)
+
+    def fresh_fourier():
+        return Fourier(w)
+
+    def passband(f):
+        f.apply_passband(400, 2000)
+        return f
+
+    stages = []
+    m = measure(lambda b: bytes2samples(b, sample_width), lambda: wav_bytes, repeats)
+    stages.append(('bytes2samples', m, len(m['result'])))
+    m = measure(read, repeats=repeats)
+    w = m['result']
+    stages.append(('WaveData', m, len(w.int_list)))
+    m = measure(lambda _: Fourier(w), repeats=repeats)
+    stages.append(('Fourier', m, m['result'].Zxx.size))
+    m = measure(passband, fresh_fourier, repeats)
+    f = m['result']
+    stages.append(('apply_passband', m, f.Zxx.size))
+    m = measure(lambda _: Bitstream(f), repeats=repeats)
+    b = m['result']
+    stages.append(('Bitstream', m, len(b.stream)))
+    m = measure(lambda _: SoftBitstream(f), repeats=repeats)
+    s = m['result']
+    stages.append(('SoftBitstream', m, len(s.stream)))
+    squared = square_up(f.max_freq_indices, b.high, b.low)
+    m = measure(rle, lambda: squared, repeats)
+    rl, values = m['result']
+    stages.append(('rle', m, len(rl)))
+    rounded = np.around(rl / b.calculated_seg_per_symbol).astype(int)
+    m = measure(lambda r: run_length_to_bitstream(r, values, b.high, b.low), lambda: rounded, repeats)
+    stages.append(('run_length_to_bitstream', m, len(m['result'])))
+    assert np.array_equal(runs_to_bits(rl, values, b.calculated_seg_per_symbol, b.high, b.low), b.stream)
+
+    records = [{'stage': name, 'seconds': m['seconds'], 'cpu_seconds': m['cpu_seconds'],
+                'peak_bytes': m['peak_bytes'], 'n_out': int(n_out)} for name, m, n_out in stages]
+    records.append({'stage': 'bit_error_rate', 'bit_error_rate': bit_error_rate(b.stream, bits),
+                    'n_bits_sent': len(bits), 'n_bits_decoded': len(b.stream)})
+    records.append({'stage': 'soft_bit_error_rate', 'bit_error_rate': bit_error_rate(s.stream, bits),
+                    'n_bits_sent': len(bits), 'n_bits_decoded': len(s.stream)})
+    return records
+
+
+def run_benchmarks(durations: list, noise: float = 0.1, repeats: int = 3, seed: int = 4481, **synth_args) -> list:
+    """Make a synthetic recording for each duration and measure every stage on it.
+
+    :param durations: Recording lengths in seconds
+    :param noise: Noise level for the synthetic signal, see write_fsk_wav()
+    :param repeats: Number of timed runs per stage (recordings over 10 minutes get 1)
+    :param seed: Seed for bits and noise
+    :param synth_args: Other parameters of write_fsk_wav(), e.g. sample_rate, sample_width, mark, space
+    :return: List of records.
+    """
+    commit = git_commit()
+    records = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for duration in durations:
+            infile = os.path.join(tmp, 'synthetic.wav')
+            bits = make_fsk_wav(infile, duration, seed, noise=noise, **synth_args)
+            for r in bench_file(infile, bits, repeats if duration <= 600 else 1):
+                r.update(commit=commit, duration=duration, noise=noise)
+                records.append(r)
+            os.remove(infile)
+    return records
+
+
+def compare(records: list, baseline: list) -> None:
+    """Print each stage's time and peak memory relative to a baseline run."""
+    old = {(r['duration'], r['stage']): r for r in baseline}
+    print("%9s %-24s %9s %8s %11s %8s" % ('duration', 'stage', 'seconds', 'ratio', 'peak MB', 'ratio'))
+    for r in records:
+        if 'seconds' not in r:
+            continue
+        b = old.get((r['duration'], r['stage']))
+        t_ratio = r['seconds'] / b['seconds'] if b and b['seconds'] else float('nan')
+        m_ratio = r['peak_bytes'] / b['peak_bytes'] if b and b['peak_bytes'] else float('nan')
+        print("%9g %-24s %9.4f %8.2f %11.1f %8.2f" %
+              (r['duration'], r['stage'], r['seconds'], t_ratio, r['peak_bytes'] / 2 ** 20, m_ratio))
+
+
+def main(argv: list = None) -> list:
+    parser = argparse.ArgumentParser(description="Benchmark each FSK pipeline stage on synthetic recordings.")
+    parser.add_argument('--durations', type=float, nargs='+', default=[1, 60, 600], help="seconds of audio")
+    parser.add_argument('--noise', type=float, default=0.1)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--sample-rate', type=int, default=22050)
+    parser.add_argument('--sample-width', type=int, default=2)
+    parser.add_argument('-o', '--output', default='bench_stages.jsonl', help="JSON lines results file")
+    parser.add_argument('--compare', default=None, help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    records = run_benchmarks(args.durations, args.noise, args.repeats, sample_rate=args.sample_rate,
+                             sample_width=args.sample_width)
+    with open(args.output, 'w') as fh:
+        for r in records:
+            fh.write(json.dumps(r) + '\n')
+    baseline = []
+    if args.compare is not None:
+        with open(args.compare) as fh:
+            baseline = [json.loads(line) for line in fh]
+    compare(records, baseline)
+    seconds = {(r['duration'], r['stage']): r['seconds'] for r in records if 'seconds' in r}
+    for duration in sorted({d for d, _ in seconds}):
+        print("%9g s: SoftBitstream takes %.2f x as long as Bitstream" %
+              (duration, seconds[duration, 'SoftBitstream'] / seconds[duration, 'Bitstream']))
+    for r in records:
+        if r['stage'] in ('bit_error_rate', 'soft_bit_error_rate'):
+            print("%9g s: %s %g (%i bits sent, %i decoded)" %
+                  (r['duration'], r['stage'].replace('_', ' '), r['bit_error_rate'], r['n_bits_sent'],
+                   r['n_bits_decoded']))
+    return records
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+import collections
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from wave_helpers import WaveData, Fourier, open_wav, bytes2samples
+from instrument import StageStats, stage
+
+
+class _CachedParams:
+    """Stands in for the closed Wave_read of a WaveData loaded from the cache, for print_summary()."""
+
+    def __init__(self, params: dict, typename: str) -> None:
+        self._params = collections.namedtuple(typename, params)(**params)  # prints like the original reader's
+
+    def getparams(self) -> tuple:
+        return self._params
+
+    def getnframes(self) -> int:
+        return self._params[3]
+
+
+class StftCache:
+    """On-disk cache of WaveData samples and Fourier magnitudes, keyed by file content and the parameters that
+    affect them. Arrays are stored as .npy files and memory-mapped on load, so a cached spectrogram costs nothing
+    until apply_passband() slices it. Only the raw frames are kept of WaveData, and the spectrogram magnitudes are
+    kept as float32. The least recently used entries are evicted to stay under a size limit. Several processes can
+    share one cache directory.
+
+    Example:
+    C = StftCache('~/.cache/fsk')
+    whole_pipeline('x.wav', outfile=None, cache=C)  # computes and saves
+    whole_pipeline('x.wav', outfile=None, cache=C, pass_lo=500)  # loads, then only slices and runs Bitstream
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 2 ** 30) -> None:
+        """
+        :param directory: Where to keep cache entries (created if needed)
+        :param max_bytes: Size limit for all entries together
+        """
+        self.directory = os.path.expanduser(str(directory))  # str() for pathlib paths on Python 3.5
+        self.max_bytes = max_bytes
+        self.index_file = os.path.join(self.directory, 'index.json')
+        self.lock_file = os.path.join(self.directory, 'index.lock')
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _read_index(self) -> dict:
+        try:
+            with open(self.index_file) as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return {'entries': {}, 'hashes': {}}
+
+    def _write_index(self, index: dict) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.json')
+        with os.fdopen(fd, 'w') as fh:
+            json.dump(index, fh)
+        os.replace(tmp, self.index_file)  # atomic, so concurrent readers never see half an index
+
+    @contextlib.contextmanager
+    def _locked_index(self, stale_seconds: float = 60):
+        """Read the index, let the caller change it, and write it back, holding a lock file throughout so that
+        other processes' changes in between are not lost. A lock older than stale_seconds is taken to be left by a
+        process that died, and removed.
+        """
+        while True:
+            try:
+                fd = os.open(self.lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.lock_file) > stale_seconds:
+                        os.remove(self.lock_file)
+                except OSError:  # released meanwhile
+                    pass
+                time.sleep(0.01)
+        try:
+            index = self._read_index()
+            yield index
+            self._write_index(index)
+        finally:
+            os.close(fd)
+            os.remove(self.lock_file)
+
+    def file_hash(self, filename: str) -> str:
+        """Hash of a file's contents. Remembered by path, size and modification time, so unchanged files are only
+        read once.
+
+        :param filename: Name of file
+        :return: Hex digest
+        """
+        st = os.stat(filename)
+        stamp = '%s:%i:%i' % (os.path.realpath(filename), st.st_size, st.st_mtime_ns)
+        known = self._read_index()['hashes'].get(stamp)
+        if known is not None:
+            return known
+        h = hashlib.sha256()
+        with open(filename, 'rb') as fh:
+            for block in iter(lambda: fh.read(2 ** 20), b''):
+                h.update(block)
+        digest = h.hexdigest()[:32]
+        with self._locked_index() as index:
+            index['hashes'][stamp] = digest
+        return digest
+
+    @staticmethod
+    def key(kind: str, **params) -> str:
+        """Make an entry name from what kind of data it is and every parameter that affects it."""
+        text = json.dumps(dict(params, kind=kind), sort_keys=True)
+        return kind + '-' + hashlib.sha256(text.encode()).hexdigest()[:32]
+
+    def load(self, key: str) -> tuple:
+        """Memory-map a cache entry and mark it as recently used.
+
+        :param key: Entry name, from key()
+        :return: Tuple of (dict of arrays, dict of metadata), or (None, None) if the entry is not cached.
+        """
+        entry_dir = os.path.join(self.directory, key)
+        try:
+            with open(os.path.join(entry_dir, 'meta.json')) as fh:
+                meta = json.load(fh)
+            arrays = {name: np.load(os.path.join(entry_dir, name + '.npy'), mmap_mode='r') for name in meta['arrays']}
+        except (OSError, ValueError):
+            return None, None
+        with self._locked_index() as index:
+            if key in index['entries']:
+                index['entries'][key]['last_used'] = time.time()
+        return arrays, meta
+
+    def save(self, key: str, arrays: dict, meta: dict) -> None:
+        """Write a cache entry, then evict least recently used entries until the cache fits in max_bytes.
+
+        :param key: Entry name, from key()
+        :param arrays: dict of name -> ndarray, each saved as a .npy file
+        :param meta: JSON-serializable metadata
+        """
+        tmp_dir = tempfile.mkdtemp(dir=self.directory, prefix='.tmp-')
+        for name, a in arrays.items():
+            np.save(os.path.join(tmp_dir, name + '.npy'), np.ascontiguousarray(a))
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as fh:
+            json.dump(dict(meta, arrays=list(arrays)), fh)
+        size = sum(os.path.getsize(os.path.join(tmp_dir, name)) for name in os.listdir(tmp_dir))
+        entry_dir = os.path.join(self.directory, key)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(tmp_dir, entry_dir)
+
+        with self._locked_index() as index:
+            index['entries'][key] = {'bytes': size, 'last_used': time.time()}
+            least_to_most = sorted(index['entries'], key=lambda k: index['entries'][k]['last_used'])
+            total = sum(e['bytes'] for e in index['entries'].values())
+            for old_key in least_to_most:
+                if total <= self.max_bytes:
+                    break
+                total -= index['entries'].pop(old_key)['bytes']
+                shutil.rmtree(os.path.join(self.directory, old_key), ignore_errors=True)
+
+    def size(self) -> int:
+        """Total bytes of all cache entries."""
+        return sum(e['bytes'] for e in self._read_index()['entries'].values())
+
+    def wave_data(self, infile: str, start_sample: int = 0, n_symbols_to_read: int = None, baud: int = 50,
+                  channel: int = 0, backend: str = 'wave', stats: StageStats = None) -> WaveData:
+        """Same as reading a WaveData from the file, but from the cache if possible.
+
+        :return: WaveData object. From the cache, wav_bytes is memory-mapped and read-only.
+        """
+        key = self.key('WaveData', file=self.file_hash(infile), start_sample=start_sample,
+                       n_symbols_to_read=n_symbols_to_read, baud=baud, channel=channel)
+        with stage(stats, 'cache.WaveData') as record:
+            arrays, meta = self.load(key)
+            record['hit'] = arrays is not None
+        if arrays is not None:
+            w = WaveData.__new__(WaveData)
+            w.__dict__.update(meta['attributes'])
+            w.wav_file = _CachedParams(meta['params'], meta['params_type'])
+            w.wav_bytes = memoryview(arrays['wav_bytes'])
+            w.int_list = bytes2samples(arrays['wav_bytes'], w.bytes_per_sample, w.n_channels, w.channel)
+            w.cache_key = key
+            return w
+
+        with open_wav(infile, backend) as wav_file:
+            w = WaveData(wav_file, start_sample, n_symbols_to_read, baud, channel, stats=stats)
+        attributes = {k: v for k, v in w.__dict__.items() if k not in ('wav_file', 'wav_bytes', 'int_list')}
+        self.save(key, {'wav_bytes': np.frombuffer(w.wav_bytes, dtype=np.uint8)},
+                  {'attributes': attributes, 'params': w.wav_file.getparams()._asdict(),
+                   'params_type': type(w.wav_file.getparams()).__name__})
+        w.cache_key = key
+        return w
+
+    def fourier(self, wave_data: WaveData, seg_per_symbol: int = 3, stats: StageStats = None) -> Fourier:
+        """Same as Fourier(wave_data, seg_per_symbol), but from the cache if possible. Only the magnitude of the
+        spectrum is kept, which is all that apply_passband() uses, and as float32. A miss returns the same float32
+        magnitudes it saves, so that later hits decode to the same bits. max_freq_indices is found before, so is the
+        same as Fourier's, but in the pass band, tones within float32 precision of each other may be told apart
+        differently than from Fourier itself.
+
+        :param wave_data: Object from wave_data(), so that it has a cache key
+        :return: Fourier object, with Zxx a float32 magnitude matrix. From the cache, it is read-only and
+            memory-mapped.
+        """
+        key = self.key('Fourier', wave_data=wave_data.cache_key, seg_per_symbol=seg_per_symbol)
+        with stage(stats, 'cache.Fourier') as record:
+            arrays, meta = self.load(key)
+            record['hit'] = arrays is not None
+        if arrays is not None:
+            f = Fourier.__new__(Fourier)
+            f.__dict__.update(arrays)
+            f.n_symbols_actually_read = meta['n_symbols_actually_read']
+            f.bin_f = f.f
+            f.stats = stats
+            return f
+
+        f = Fourier(wave_data, seg_per_symbol, stats=stats)
+        f.Zxx = np.abs(f.Zxx).astype(np.float32)
+        self.save(key, {'f': f.f, 't': f.t, 'Zxx': f.Zxx, 'max_freq_indices': f.max_freq_indices},
+                  {'n_symbols_actually_read': f.n_symbols_actually_read})
+        return f
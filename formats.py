@@ -0,0 +1,219 @@
+"""Compact, self-describing files for bitstreams and spectrogram magnitudes.
+
+File layout: the magic bytes b'\\x93FSK', a format version byte, the header length as a little-endian uint32, a JSON
+header, then each array's raw bytes. Arrays start on 64-byte boundaries, so they can be memory-mapped. The header
+holds the kind of data, free-form metadata, and each array's name, dtype, shape and offset.
+"""
+import collections
+import json
+import struct
+
+import numpy as np
+
+from wave_helpers import rle
+
+MAGIC = b'\x93FSK'
+VERSION = 1
+ALIGN = 64
+
+PackedStream = collections.namedtuple('PackedStream', 'encoding arrays meta')
+
+
+def _smallest_uint(max_value: int) -> np.dtype:
+    """Smallest unsigned dtype that holds 0 to max_value."""
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_value <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.uint64)
+
+
+def write_arrays(filename: str, kind: str, arrays: dict, meta: dict = None) -> int:
+    """Write named arrays and metadata to one file.
+
+    :param filename: Name of output file
+    :param kind: What the file holds, e.g. 'bitstream' or 'spectrogram', checked by readers
+    :param arrays: dict of name -> ndarray
+    :param meta: JSON-serializable metadata
+    :return: Size of the file in bytes
+    """
+    entries = []
+    offset = 0
+    for name, a in arrays.items():
+        a = np.ascontiguousarray(a)
+        entries.append({'name': name, 'dtype': a.dtype.str, 'shape': list(a.shape), 'offset': offset})
+        offset += -(-a.nbytes // ALIGN) * ALIGN
+    header = json.dumps({'kind': kind, 'meta': meta or {}, 'arrays': entries}).encode()
+    prefix_length = len(MAGIC) + 1 + 4
+    header += b' ' * (-(prefix_length + len(header)) % ALIGN)  # so the first array is aligned too
+    with open(filename, 'wb') as fh:
+        fh.write(MAGIC + struct.pack('<BI', VERSION, len(header)) + header)
+        for a in arrays.values():
+            data = np.ascontiguousarray(a).tobytes()
+            fh.write(data + b'\0' * (-len(data) % ALIGN))
+        return fh.tell()
+
+
+def read_arrays(filename: str, kind: str = None, mmap: bool = False) -> tuple:
+    """Read a file written by write_arrays().
+
+    :param filename: Name of file
+    :param kind: Expected kind, or `None` to accept any
+    :param mmap: Memory-map the arrays (read-only) instead of reading them into memory
+    :return: Tuple of (kind, dict of name -> ndarray, metadata dict).
+    :raises: ValueError if the file is not in this format, or not of the expected kind
+    """
+    with open(filename, 'rb') as fh:
+        prefix = fh.read(len(MAGIC) + 5)
+        if len(prefix) < len(MAGIC) + 5 or prefix[:len(MAGIC)] != MAGIC:
+            raise ValueError("%s is not a compact FSK file" % filename)
+        version, header_length = struct.unpack('<BI', prefix[len(MAGIC):])
+        if version != VERSION:
+            raise ValueError("%s has format version %i, expected %i" % (filename, version, VERSION))
+        header = json.loads(fh.read(header_length).decode('utf-8'))  # json takes bytes only from Python 3.6
+        data_start = len(prefix) + header_length
+        if kind is not None and header['kind'] != kind:
+            raise ValueError("%s holds a %s, expected a %s" % (filename, header['kind'], kind))
+        arrays = {}
+        for entry in header['arrays']:
+            dtype, shape = np.dtype(entry['dtype']), tuple(entry['shape'])
+            if mmap:
+                arrays[entry['name']] = np.memmap(filename, dtype, 'r', data_start + entry['offset'], shape)
+            else:
+                fh.seek(data_start + entry['offset'])
+                count = int(np.prod(shape))
+                arrays[entry['name']] = np.fromfile(fh, dtype, count).reshape(shape)
+    return header['kind'], arrays, header['meta']
+
+
+def pack_stream(stream: np.ndarray, encoding: str = 'packbits') -> PackedStream:
+    """Store a bitstream compactly, without losing anything.
+
+    :param stream: Array of bits, as from Bitstream.stream. May hold undecided (other) values.
+    :param encoding: 'packbits' for 8 bits per byte, best for busy signals. Undecided values are kept separately.
+        'runs' for run lengths and values from rle(), best for signals with long idle runs.
+    :return: PackedStream of the encoding, dict of arrays, and metadata (n_bits).
+    :raises: ValueError if encoding is unknown
+    """
+    stream = np.asarray(stream)
+    meta = {'n_bits': len(stream)}
+    if encoding == 'packbits':
+        undecided = np.flatnonzero((stream != 0) & (stream != 1))
+        values = stream[undecided]
+        arrays = {'bits': np.packbits(stream == 1),
+                  'undecided_positions': undecided.astype(_smallest_uint(len(stream))),
+                  'undecided_values': values.astype(np.int64)}
+    elif encoding == 'runs':
+        rl, values = rle(stream)
+        if rl is None:
+            rl, values = np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+        small = values.min() >= 0 and values.max() <= 255 if len(values) else True
+        arrays = {'run_lengths': rl.astype(_smallest_uint(rl.max() if len(rl) else 0)),
+                  'values': values.astype(np.uint8 if small else np.int64)}
+    else:
+        raise ValueError("Unknown bitstream encoding: %s" % encoding)
+    return PackedStream(encoding, arrays, meta)
+
+
+def unpack_stream(packed: PackedStream) -> np.ndarray:
+    """Undo pack_stream().
+
+    :param packed: PackedStream
+    :return: Array of bits (int), equal to the original stream
+    :raises: ValueError if encoding is unknown
+    """
+    if packed.encoding == 'packbits':
+        stream = np.unpackbits(packed.arrays['bits'], count=packed.meta['n_bits']).astype(int)
+        stream[packed.arrays['undecided_positions'].astype(np.int64)] = packed.arrays['undecided_values']
+        return stream
+    elif packed.encoding == 'runs':
+        return np.repeat(packed.arrays['values'].astype(int), packed.arrays['run_lengths'].astype(np.int64))
+    raise ValueError("Unknown bitstream encoding: %s" % packed.encoding)
+
+
+def write_bitstream(filename: str, stream: np.ndarray, encoding: str = 'packbits', **meta) -> int:
+    """Save a bitstream in the compact file format.
+
+    Example:
+    write_bitstream('x.fsk', b.stream, infile='x.wav', baud=50)
+    stream, meta = read_bitstream('x.fsk')
+
+    :param filename: Name of output file
+    :param stream: Array of bits, as from Bitstream.stream
+    :param encoding: 'packbits' or 'runs', see pack_stream()
+    :param meta: Anything else worth keeping with the bits, e.g. infile, baud, mark_hz. Keys that the format needs
+        to read the bits back, like 'n_bits', are overwritten.
+    :return: Size of the file in bytes
+    """
+    packed = pack_stream(stream, encoding)
+    header = dict(meta)
+    header.update(packed.meta)
+    header['encoding'] = encoding
+    return write_arrays(filename, 'bitstream', packed.arrays, header)
+
+
+def read_bitstream(filename: str) -> tuple:
+    """Load a bitstream saved by write_bitstream().
+
+    :return: Tuple of (array of bits, metadata dict).
+    """
+    _, arrays, meta = read_arrays(filename, 'bitstream')
+    return unpack_stream(PackedStream(meta['encoding'], arrays, meta)), meta
+
+
+def quantize(magnitude: np.ndarray, dtype: str = 'float32', peak: float = None) -> tuple:
+    """Store spectrogram magnitudes in fewer bytes.
+
+    :param magnitude: Array of non-negative magnitudes, e.g. Fourier.Zxx after apply_passband()
+    :param dtype: 'float32', or 'uint16' or 'uint8' to scale the largest magnitude to the largest integer
+    :param peak: Largest magnitude, when quantizing a spectrogram a piece at a time. `None` for the largest in
+        magnitude.
+    :return: Tuple of (array, scale), where array * scale approximates the magnitudes.
+    :raises: ValueError if dtype is not one of those
+    """
+    if dtype == 'float32':
+        return np.asarray(magnitude, dtype=np.float32), 1.0
+    if dtype not in ('uint8', 'uint16'):
+        raise ValueError("Unsupported magnitude dtype: %s" % dtype)
+    top = np.iinfo(dtype).max
+    if peak is None:
+        peak = float(np.max(magnitude)) if np.size(magnitude) else 0.0
+    scale = peak / top if peak > 0 else 1.0
+    return np.rint(np.asarray(magnitude) / scale).astype(dtype), scale
+
+
+def dequantize(array: np.ndarray, scale: float) -> np.ndarray:
+    """Undo quantize(), as float32."""
+    return array.astype(np.float32) * np.float32(scale)
+
+
+def write_spectrogram(filename: str, f: np.ndarray, t: np.ndarray, magnitude: np.ndarray, dtype: str = 'float32',
+                      scale: float = None, **meta) -> int:
+    """Save spectrogram magnitudes in the compact file format.
+
+    Example:
+    write_spectrogram('x.fsks', F.f, F.t, F.Zxx, 'uint8')
+
+    :param filename: Name of output file
+    :param f: Frequency of each row
+    :param t: Time of each column
+    :param magnitude: Magnitudes (frequencies * times), or already quantized values if scale is given
+    :param dtype: 'float32', 'uint16' or 'uint8', see quantize(). Ignored if scale is given.
+    :param scale: Scale of already quantized values, as from Fourier.apply_passband(dtype=...)
+    :param meta: Anything else worth keeping with the spectrogram
+    :return: Size of the file in bytes
+    """
+    if scale is None:
+        magnitude, scale = quantize(magnitude, dtype)
+    return write_arrays(filename, 'spectrogram', {'f': f, 't': t, 'magnitude': magnitude}, dict(meta, scale=scale))
+
+
+def read_spectrogram(filename: str, mmap: bool = False) -> tuple:
+    """Load a spectrogram saved by write_spectrogram().
+
+    :param filename: Name of file
+    :param mmap: Memory-map the magnitudes instead of reading them
+    :return: Tuple of (f, t, stored magnitudes, metadata dict). Multiply the magnitudes by meta['scale'], or use
+        dequantize(), for real magnitudes.
+    """
+    _, arrays, meta = read_arrays(filename, 'spectrogram', mmap)
+    return arrays['f'], arrays['t'], arrays['magnitude'], meta
@@ -0,0 +1,111 @@
+import contextlib
+import json
+import time
+import tracemalloc
+
+
+class StageStats:
+    """Collect wall time, CPU time, peak allocated memory and output sizes for each pipeline stage.
+
+    Pass one to whole_pipeline(), WaveData, Fourier or Bitstream as `stats=...` to turn instrumentation on. With the
+    default `stats=None` nothing is measured.
+
+    Example:
+    S = StageStats()
+    whole_pipeline(outfile=None, stats=S)
+    S.records -> [{'stage': 'WaveData', 'wall_seconds': 0.0004, ..., 'samples_read': 22227}, ...]
+    """
+
+    def __init__(self, callback=None, trace_memory: bool = False) -> None:
+        """
+        :param callback: Function called with each stage's record as soon as the stage finishes
+        :param trace_memory: Measure peak allocated bytes with tracemalloc. This slows the pipeline down a lot.
+        """
+        self.callback = callback
+        self.trace_memory = trace_memory
+        self.records = []
+        self._open = []  # peak traced bytes seen so far by each stage that has not finished, innermost last
+
+    @staticmethod
+    def _reset_peak() -> None:
+        """Start measuring the peak again from the current traced memory. tracemalloc can only do that from Python
+        3.9. Before, the peak carries on from before the stage, as restarting the tracer would throw away tracing
+        that the caller started. A stage's peak_bytes is then an upper bound if something earlier traced more.
+        """
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """Measure the code inside a `with` block as one stage. Stages can be nested.
+
+        :param name: Stage name for the record
+        :return: The record dict, so the block can add sizes to it, e.g. record['n_bits'] = 49
+        """
+        record = {'stage': name}
+        started_tracing = False
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            current, peak = tracemalloc.get_traced_memory()
+            self._open = [max(seen, peak) for seen in self._open]  # before _reset_peak() forgets it
+            self._open.append(current)
+            self._reset_peak()
+            baseline = current
+        t0, cpu0 = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_seconds'] = time.perf_counter() - t0
+            record['cpu_seconds'] = time.process_time() - cpu0
+            if self.trace_memory:
+                peak = max(tracemalloc.get_traced_memory()[1], self._open.pop())
+                self._open = [max(seen, peak) for seen in self._open]
+                record['peak_bytes'] = peak - baseline
+                if started_tracing:  # only if this stage started it, so the caller's own tracing carries on
+                    tracemalloc.stop()
+            self.records.append(record)
+            if self.callback is not None:
+                self.callback(record)
+
+    def totals(self) -> dict:
+        """Sum wall and CPU seconds over stages of the same name.
+
+        :return: dict of stage name -> {'wall_seconds': ..., 'cpu_seconds': ..., 'count': ...}
+        """
+        totals = {}
+        for r in self.records:
+            t = totals.setdefault(r['stage'], {'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'count': 0})
+            t['wall_seconds'] += r['wall_seconds']
+            t['cpu_seconds'] += r['cpu_seconds']
+            t['count'] += 1
+        return totals
+
+    def write_jsonl(self, filename: str, mode: str = 'a', **extra) -> None:
+        """Append one JSON line per stage record, for aggregating across runs.
+
+        :param filename: Name of JSON lines file
+        :param mode: 'a' to append, 'w' to overwrite
+        :param extra: Fields added to every line, e.g. infile='x.wav', run_id=3
+        """
+        with open(filename, mode) as fh:
+            for r in self.records:
+                fh.write(json.dumps(dict(extra, **r)) + '\n')
+
+
+def stage(stats: StageStats, name: str):
+    """Context manager for one stage of `stats`, or a do-nothing one when stats is None.
+
+    :param stats: StageStats object or None
+    :param name: Stage name for the record
+    """
+    if stats is None:
+        return _no_stage()
+    return stats.stage(name)
+
+
+@contextlib.contextmanager
+def _no_stage():
+    """Do-nothing stage, whose record is thrown away. Like contextlib.nullcontext({}), which needs Python 3.7."""
+    yield {}
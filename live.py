@@ -0,0 +1,425 @@
+"""Decode FSK in real time from raw PCM on stdin or a FIFO, e.g. from arecord or an SDR program.
+
+arecord -t raw -f S16_LE -r 22050 -c 1 | python live.py
+rtl_fm -M usb -f 8.0M -s 22050 - | python live.py --framing 5N1
+python live.py --replay sample-data.wav --speed 10 --stats   # test with a recording
+"""
+import argparse
+import collections
+import json
+import os
+import sys
+import threading
+import time
+from typing import Generator
+
+import numpy as np
+
+from wave_helpers import bytes2samples, square_up, rle, run_length_to_bitstream, infer_mark_space, open_wav
+
+
+class LiveStats:
+    """Counters for a live decode: blocks read and dropped, bits out, and end-to-end latency of each bit, from the
+    arrival of the end of its symbol to the bit being handed out."""
+
+    def __init__(self, latency_budget: float) -> None:
+        """
+        :param latency_budget: Seconds. Bits that take longer count as late.
+        """
+        self.latency_budget = latency_budget
+        self.blocks_read = 0
+        self.blocks_dropped = 0
+        self.samples_dropped = 0
+        self.bits = 0
+        self.late_bits = 0
+        self.latency_max = 0.0
+        self.latency_histogram = np.zeros(10001, dtype=np.int64)  # 1 ms bins, the last one is 10 s or more
+
+    def add_latencies(self, latencies: np.ndarray) -> None:
+        """Count the latencies (seconds) of a batch of bits."""
+        if len(latencies) == 0:
+            return
+        self.bits += len(latencies)
+        self.late_bits += int(np.count_nonzero(latencies > self.latency_budget))
+        self.latency_max = max(self.latency_max, float(latencies.max()))
+        bins = np.clip((latencies * 1000).astype(int), 0, len(self.latency_histogram) - 1)
+        self.latency_histogram += np.bincount(bins, minlength=len(self.latency_histogram))
+
+    def latency_percentile(self, q: float) -> float:
+        """Latency in seconds that q percent of bits were faster than, to the nearest ms."""
+        if self.bits == 0:
+            return float('nan')
+        return float(np.searchsorted(np.cumsum(self.latency_histogram), q / 100 * self.bits) + 1) / 1000
+
+    def summary(self) -> dict:
+        return {'blocks_read': self.blocks_read, 'blocks_dropped': self.blocks_dropped,
+                'samples_dropped': self.samples_dropped, 'bits': self.bits, 'late_bits': self.late_bits,
+                'latency_budget': self.latency_budget, 'latency_median': self.latency_percentile(50),
+                'latency_p99': self.latency_percentile(99), 'latency_max': self.latency_max}
+
+
+class RingBuffer:
+    """Fixed-size buffer of samples between a reader thread and the decoder. If the decoder falls behind by more than
+    the capacity, the oldest unread samples are overwritten, and the write that did it counts as a dropped block."""
+
+    def __init__(self, capacity: int) -> None:
+        """
+        :param capacity: Number of samples
+        """
+        self.capacity = capacity
+        self.buf = np.zeros(capacity)
+        self.written = 0  # total samples ever written
+        self.read_to = 0  # total samples ever read or dropped
+        self.blocks_dropped = 0
+        self.samples_dropped = 0
+        self.arrivals = collections.deque(maxlen=1024)  # (total written, time) after each write
+        self.closed = False
+        self.ready = threading.Condition()
+
+    def write(self, samples: np.ndarray, arrival_time: float) -> None:
+        """Add a block of samples, at most capacity long, that arrived at a given time."""
+        with self.ready:
+            self.buf[(self.written + np.arange(len(samples))) % self.capacity] = samples
+            self.written += len(samples)
+            overflow = self.written - self.read_to - self.capacity
+            if overflow > 0:
+                self.read_to += overflow
+                self.samples_dropped += overflow
+                self.blocks_dropped += 1
+            self.arrivals.append((self.written, arrival_time))
+            self.ready.notify()
+
+    def close(self) -> None:
+        """No more samples will be written."""
+        with self.ready:
+            self.closed = True
+            self.ready.notify()
+
+    def read(self) -> tuple:
+        """Wait for samples, then take all that are unread.
+
+        :return: Tuple of (array of samples, total index of the first one), or None once closed and empty.
+        """
+        with self.ready:
+            self.ready.wait_for(lambda: self.written > self.read_to or self.closed)
+            if self.written == self.read_to:
+                return None
+            start = self.read_to
+            samples = self.buf[np.arange(start, self.written) % self.capacity]
+            self.read_to = self.written
+            return samples, start
+
+    def arrival_times(self, sample_indices: np.ndarray) -> np.ndarray:
+        """When samples arrived, by total index. Samples older than the arrival log get its oldest time."""
+        with self.ready:
+            ends, times = np.array(self.arrivals).reshape(-1, 2).T
+        i = np.searchsorted(ends, sample_indices, side='right')
+        return times[np.minimum(i, len(times) - 1)]
+
+
+class LiveDecoder:
+    def __init__(self, sample_rate: int = 22050, baud: float = 50, seg_per_symbol: int = 3, pass_lo: float = 400,
+                 pass_hi: float = 2000, adapt_symbols: float = 200, first_sample: int = 0) -> None:
+        """Turn samples into bits as they arrive, with the same STFT and run-length logic as Fourier and Bitstream.
+        Mark and space come from a histogram of recent segments that forgets old ones, so they follow the signal
+        instead of being fixed by one pass over a whole recording. Bits of a long run are handed out one symbol at a
+        time, without waiting for the run to end.
+
+        Example:
+        D = LiveDecoder()
+        bits, ends = D.feed(samples)  # any number of samples at a time
+        bits, ends = D.flush()
+
+        :param sample_rate: Samples per second
+        :param baud: Symbols per second
+        :param seg_per_symbol: Same as for Fourier, sets the STFT segment length
+        :param pass_lo: Spectrum below this frequency (Hz) is ignored as neither mark nor space.
+        :param pass_hi: Spectrum above this frequency (Hz) is ignored as neither mark nor space.
+        :param adapt_symbols: Half-life of the mark/space histogram, in symbols
+        :param first_sample: Index of the first sample, for the symbol end positions returned by feed()
+        """
+        from scipy import signal  # only when live decoding is actually used
+        self._stft = signal.stft
+        self.sample_rate = sample_rate
+        samples_per_symbol = sample_rate / baud
+        self.nperseg = int(samples_per_symbol / seg_per_symbol)
+        self.hop = self.nperseg - self.nperseg // 2
+        self.seg_per_symbol = samples_per_symbol / self.hop  # FT segments per symbol
+        self.pass_lo, self.pass_hi = pass_lo, pass_hi
+        self.decay = 0.5 ** (1 / (adapt_symbols * self.seg_per_symbol))  # per segment
+        self.max_held = int(adapt_symbols * self.seg_per_symbol)
+        self.counts = np.zeros(14)  # decaying version of freq_histogram()
+        self.mark_space = None
+        self.reset(first_sample)
+
+    def reset(self, first_sample: int) -> None:
+        """Start over after a gap in the samples, keeping what has been learned about mark and space.
+
+        :param first_sample: Index of the next sample that will be fed
+        """
+        self.first_sample = first_sample
+        self.carry = np.zeros(0)  # samples not yet covered by a whole segment
+        self.n_segments = 0  # segments computed since the reset
+        self.held = np.zeros(0, dtype=int)  # segments waiting for mark and space to be known
+        self.run_value, self.run_length, self.run_emitted = None, 0, 0  # the last run, which may not be over
+
+    def _segment_indices(self, samples: np.ndarray) -> np.ndarray:
+        """Most intense passband frequency bin of each newly complete FT segment."""
+        buf = np.concatenate((self.carry, samples))
+        n_seg = (len(buf) - self.nperseg) // self.hop + 1 if len(buf) >= self.nperseg else 0
+        self.carry = buf[n_seg * self.hop:]
+        if n_seg == 0:
+            return np.zeros(0, dtype=int)
+        f, _, zxx = self._stft(buf[:(n_seg - 1) * self.hop + self.nperseg], fs=self.sample_rate,
+                               nperseg=self.nperseg, boundary=None, padded=False)
+        selected_indices = ((self.pass_lo < f) * (f < self.pass_hi))
+        return np.abs(zxx[selected_indices]).argmax(0)
+
+    def _adapt(self, idx: np.ndarray) -> None:
+        """Update the mark/space histogram with new segments, the newest weighing most."""
+        weights = self.decay ** np.arange(len(idx) - 1, -1, -1)
+        self.counts = self.counts * self.decay ** len(idx) + np.bincount(np.minimum(idx, 13), weights, minlength=14)
+        try:
+            high, low = infer_mark_space(self.counts)
+        except ValueError:
+            return
+        if min(self.counts[high], self.counts[low]) >= self.seg_per_symbol:  # at least a symbol of each
+            self.mark_space = (high, low)
+
+    def _emit(self, rl: np.ndarray, values: np.ndarray, final: bool) -> tuple:
+        """Bits for runs of segments that end at the newest segment. All but the last run are complete."""
+        high, low = self.mark_space
+        starts = self.n_segments - np.cumsum(rl[::-1])[::-1]
+        n_bits = np.around(rl / self.seg_per_symbol).astype(int)
+        if not final:
+            n_bits[-1] = int(rl[-1] // self.seg_per_symbol)  # whole symbols so far, never more than when it ends
+        n_bits[0] -= self.run_emitted  # the first run continues the one from last time
+        bits = run_length_to_bitstream(n_bits, values, high, low)
+        run = np.repeat(np.arange(len(rl)), n_bits)
+        symbol = np.arange(len(bits)) - np.repeat(np.cumsum(n_bits) - n_bits, n_bits)  # position within the run
+        symbol[run == 0] += self.run_emitted
+        end_segment = np.minimum(starts[run] + (symbol + 1) * self.seg_per_symbol, starts[run] + rl[run])
+        ends = self.first_sample + (end_segment * self.hop).astype(np.int64) + self.nperseg // 2
+        return bits, ends
+
+    def feed(self, samples: np.ndarray, final: bool = False) -> tuple:
+        """Decode newly arrived samples.
+
+        :param samples: Array of samples, continuing the ones before
+        :param final: True if no more samples will come, so the last run is complete
+        :return: Tuple of (array of bits, and for each bit the index of the sample where its symbol ended).
+        """
+        new = self._segment_indices(samples)
+        self.n_segments += len(new)
+        if len(new):
+            self._adapt(new)
+        idx = np.concatenate((self.held, new))
+        no_bits = np.zeros(0, dtype=int), np.zeros(0, dtype=np.int64)
+        if self.mark_space is None:
+            self.held = idx[-self.max_held:]
+            return no_bits
+        self.held = np.zeros(0, dtype=int)
+        rl, values = rle(square_up(idx, *self.mark_space))
+        if rl is None:
+            rl, values = np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+        if self.run_value is not None:
+            if len(values) and values[0] == self.run_value:
+                rl[0] += self.run_length
+            else:
+                rl = np.append(self.run_length, rl)
+                values = np.append(self.run_value, values)
+        if len(rl) == 0:
+            return no_bits
+        bits, ends = self._emit(rl, values, final)
+        if final:
+            self.run_value, self.run_length, self.run_emitted = None, 0, 0
+        else:
+            self.run_value, self.run_length = values[-1], rl[-1]
+            self.run_emitted = int(rl[-1] // self.seg_per_symbol)
+        return bits, ends
+
+    def flush(self) -> tuple:
+        """Decode the last run. Same return as feed()."""
+        return self.feed(np.zeros(0), final=True)
+
+
+def _read_blocks(fh, ring: RingBuffer, block_frames: int, sample_width: int, n_channels: int, channel: int,
+                 stats: LiveStats, clock) -> None:
+    """Reader thread of live_bitstream(): put blocks of samples into the ring buffer until fh ends, then close it."""
+    frame_bytes = sample_width * n_channels
+    try:
+        while True:
+            data = fh.read(block_frames * frame_bytes)
+            n_whole = len(data) // frame_bytes * frame_bytes  # a partial frame only at the very end
+            if n_whole:
+                ring.write(bytes2samples(data[:n_whole], sample_width, n_channels, channel), clock())
+                if stats is not None:
+                    stats.blocks_read += 1
+            if len(data) < block_frames * frame_bytes:
+                break
+    finally:
+        ring.close()
+
+
+def _decode_read(decoder: LiveDecoder, got: tuple, expected: int) -> tuple:
+    """Decode what one RingBuffer.read() returned, starting over after any gap. See live_bitstream().
+
+    :param decoder: LiveDecoder
+    :param got: Tuple of (samples, index of the first), or `None` at the end of the stream
+    :param expected: Index of the next sample if none were dropped
+    :return: Tuple of (list of (bits, ends) from LiveDecoder.feed() or flush(), the new `expected`).
+    """
+    if got is None:
+        return [decoder.flush()], expected
+    samples, start = got
+    results = []
+    if start != expected:  # samples were dropped
+        results.append(decoder.flush())
+        decoder.reset(start)
+    results.append(decoder.feed(samples))
+    return results, start + len(samples)
+
+
+def live_bitstream(fh, sample_rate: int = 22050, sample_width: int = 2, n_channels: int = 1, channel: int = 0,
+                   baud: float = 50, seg_per_symbol: int = 3, pass_lo: float = 400, pass_hi: float = 2000,
+                   block_frames: int = None, ring_seconds: float = 5.0, stats: LiveStats = None,
+                   clock=time.monotonic) -> Generator[np.ndarray, None, None]:
+    """Decode raw PCM from a pipe, FIFO or file as it arrives. A reader thread puts blocks of samples into a ring
+    buffer, and the decoder takes everything that has arrived each time it is ready, so it never falls behind for
+    long. If it does fall behind by more than the ring buffer, samples are dropped and decoding starts over after
+    the gap.
+
+    Example:
+    for bits in live_bitstream(sys.stdin.buffer):
+        ...
+
+    :param fh: Binary file object to read little-endian PCM frames from, like WAV data without a header
+    :param sample_rate: Samples per second
+    :param sample_width: Bytes per sample, 1 to 4. 1 is unsigned, the others signed, as in WAV.
+    :param n_channels: Number of interleaved channels
+    :param channel: Which channel to decode
+    :param baud: Symbols per second
+    :param seg_per_symbol: Same as for Fourier
+    :param pass_lo: Spectrum below this frequency (Hz) is ignored as neither mark nor space.
+    :param pass_hi: Spectrum above this frequency (Hz) is ignored as neither mark nor space.
+    :param block_frames: How many frames to read at once. `None` for one FT segment hop, the least latency.
+    :param ring_seconds: Ring buffer size, in seconds of audio
+    :param stats: LiveStats to count blocks, drops and latency in. `None` to not count.
+    :param clock: Function returning the time in seconds, for latency
+    :return: Yield arrays of bits, as soon as they are decided.
+    """
+    decoder = LiveDecoder(sample_rate, baud, seg_per_symbol, pass_lo, pass_hi)
+    block_frames = decoder.hop if block_frames is None else block_frames
+    ring = RingBuffer(max(int(ring_seconds * sample_rate), block_frames))
+    reader = threading.Thread(target=_read_blocks, daemon=True,
+                              args=(fh, ring, block_frames, sample_width, n_channels, channel, stats, clock))
+    reader.start()
+    expected = 0  # index of the next sample if none are dropped
+    while True:
+        got = ring.read()
+        results, expected = _decode_read(decoder, got, expected)
+        for bits, ends in results:
+            if stats is not None:
+                stats.add_latencies(clock() - ring.arrival_times(ends))
+            if len(bits):
+                yield bits
+        if got is None:
+            break
+    reader.join()
+    if stats is not None:
+        stats.blocks_dropped = ring.blocks_dropped
+        stats.samples_dropped = ring.samples_dropped
+
+
+def replay_wav(infile: str, fh, speed: float = 1.0, block_frames: int = 1024, clock=time.monotonic,
+               sleep=time.sleep) -> None:
+    """Write a WAV file's frames as raw PCM at a steady rate, like a sound card would, to test live decoding.
+
+    :param infile: Name of input WAV file
+    :param fh: Binary file object to write to, e.g. a pipe
+    :param speed: 1 for real time, 10 for ten times faster. `None` for as fast as possible.
+    :param block_frames: How many frames to write at once
+    :param clock: Function returning the time in seconds
+    :param sleep: Function to wait a number of seconds
+    """
+    with open_wav(infile) as wav_file:
+        rate = wav_file.getframerate()
+        t0 = clock()
+        n_written = 0
+        while True:
+            data = wav_file.readframes(block_frames)
+            if not data:
+                break
+            n_written += len(data) // (wav_file.getsampwidth() * wav_file.getnchannels())
+            if speed is not None:
+                sleep(max(t0 + n_written / rate / speed - clock(), 0))  # a block is sent once it has all arrived
+            fh.write(data)
+            fh.flush()
+
+
+def _print_decoded(fh, args: argparse.Namespace, stats: LiveStats, pcm_args: dict) -> None:
+    """Write bits, or characters with --framing, to stdout as they are decoded from fh. See main()."""
+    uart = None
+    if args.framing is not None:
+        from uart import UartDecoder
+        uart = UartDecoder(args.framing)
+    for bits in live_bitstream(fh, channel=args.channel, baud=args.baud, seg_per_symbol=args.seg_per_symbol,
+                               pass_lo=args.pass_lo, pass_hi=args.pass_hi, stats=stats, **pcm_args):
+        if uart is None:
+            sys.stdout.write(''.join('01'[b] if b in (0, 1) else '?' for b in bits))
+        else:
+            sys.stdout.write(uart.feed(bits)[1])
+        sys.stdout.flush()
+    if uart is not None:
+        sys.stdout.write(uart.flush()[1])
+    sys.stdout.write('\n')
+
+
+def main(argv: list = None) -> LiveStats:
+    parser = argparse.ArgumentParser(description="Decode FSK from raw PCM on stdin or a FIFO, as it arrives.")
+    parser.add_argument('input', nargs='?', default='-', help="FIFO or file of raw PCM, or - for stdin")
+    parser.add_argument('--rate', type=int, default=22050, help="samples per second")
+    parser.add_argument('--width', type=int, default=2, help="bytes per sample")
+    parser.add_argument('--channels', type=int, default=1)
+    parser.add_argument('--channel', type=int, default=0, help="which channel to decode")
+    parser.add_argument('--baud', type=float, default=50)
+    parser.add_argument('--seg-per-symbol', type=int, default=3)
+    parser.add_argument('--pass-lo', type=float, default=400)
+    parser.add_argument('--pass-hi', type=float, default=2000)
+    parser.add_argument('--framing', default=None, help="print characters with this framing, e.g. 5N1, not bits")
+    parser.add_argument('--latency-symbols', type=float, default=3, help="latency budget for --stats")
+    parser.add_argument('--stats', action='store_true', help="print block, drop and latency counts to stderr")
+    parser.add_argument('--replay', default=None, help="WAV file to play into the decoder instead of the input")
+    parser.add_argument('--speed', type=float, default=1.0, help="replay speed, 1 is real time")
+    args = parser.parse_args(argv)
+
+    stats = LiveStats(args.latency_symbols / args.baud)
+    pcm_args = dict(sample_rate=args.rate, sample_width=args.width, n_channels=args.channels)
+    if args.replay is not None:
+        with open_wav(args.replay) as wav_file:
+            pcm_args = dict(sample_rate=wav_file.getframerate(), sample_width=wav_file.getsampwidth(),
+                            n_channels=wav_file.getnchannels())
+        read_fd, write_fd = os.pipe()
+        fh = os.fdopen(read_fd, 'rb')
+
+        def replay_into_pipe():
+            with os.fdopen(write_fd, 'wb') as out:
+                replay_wav(args.replay, out, args.speed)
+        threading.Thread(target=replay_into_pipe, daemon=True).start()
+    elif args.input == '-':
+        fh = sys.stdin.buffer
+    else:
+        fh = open(args.input, 'rb')
+
+    try:
+        _print_decoded(fh, args, stats, pcm_args)
+    finally:
+        if fh is not sys.stdin.buffer:  # our own file or replay pipe
+            fh.close()
+    if args.stats:
+        print(json.dumps(stats.summary()), file=sys.stderr)
+    return stats
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+import collections
+import mmap
+import os
+import struct
+import wave  # for wave.Error, so callers can catch the same exception as from wave.open()
+
+import numpy as np
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+RF64_SIZE_FLAG = 0xFFFFFFFF  # 32-bit size fields hold this when the real size is in the ds64 chunk
+
+wave_params = collections.namedtuple('wave_params', 'nchannels sampwidth framerate nframes comptype compname')
+
+
+class MappedWave:
+    """Memory-mapped, read-only PCM WAV file. Has the reading methods of wave.Wave_read, so it can be passed to
+    WaveData in place of a wave.open() object, but readframes() returns a zero-copy memoryview into the mapping.
+    WaveData still converts its whole window to an array of samples, so there this saves only the read copy; the
+    streaming and parallel readers keep memory bounded by taking one block at a time.
+    Handles plain RIFF, WAVE_FORMAT_EXTENSIBLE, and RF64/BW64 files over 4 GB."""
+
+    def __init__(self, filename: str) -> None:
+        """Map the file and parse its RIFF/RF64, fmt and data chunk headers. Sample data is not read.
+
+        Example:
+        M = MappedWave('sample-data.wav')
+        M.data -> array([ 35, 255,  94, 255, ...], dtype=uint8)  # read-only view of the data chunk
+
+        :param filename: Name of WAV file
+        :raises: wave.Error if the file is not an uncompressed PCM WAV file
+        """
+        with open(filename, 'rb') as fh:
+            if os.fstat(fh.fileno()).st_size == 0:  # mmap cannot map an empty file, and would raise ValueError
+                raise wave.Error("file does not start with RIFF/RF64 id and WAVE format")
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)  # fd is duplicated, fh can close
+        fmt, data_offset, data_size = self._parse_chunks(self._map)
+        format_tag, self._nchannels, self._framerate, _, block_align, bits_per_sample = struct.unpack_from(
+            '<HHIIHH', fmt)
+        if format_tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+            format_tag = struct.unpack_from('<H', fmt, 24)[0]  # first 2 bytes of the SubFormat GUID
+        if format_tag != WAVE_FORMAT_PCM:
+            raise wave.Error("unknown format: %i" % format_tag)
+        if self._nchannels == 0 or block_align % self._nchannels != 0:
+            raise wave.Error("bad block alignment %i for %i channels" % (block_align, self._nchannels))
+        self._sampwidth = block_align // self._nchannels
+        self._framewidth = block_align
+
+        data_size = min(data_size, len(self._map) - data_offset)  # tolerate truncated recordings
+        self._nframes = data_size // block_align
+        self._view = memoryview(self._map)[data_offset:data_offset + self._nframes * block_align]
+        self.data = np.frombuffer(self._view, dtype=np.uint8)  # read-only, since the map is
+        self._pos = 0
+
+    @staticmethod
+    def _parse_chunks(buf: mmap.mmap) -> tuple:
+        """Walk the chunk list of a RIFF or RF64 file.
+
+        :param buf: The whole file
+        :return: Tuple of (fmt chunk bytes, data chunk offset, data chunk size).
+        :raises: wave.Error if required chunks are missing
+        """
+        if len(buf) < 12 or buf[8:12] != b'WAVE' or buf[0:4] not in (b'RIFF', b'RF64', b'BW64'):
+            raise wave.Error("file does not start with RIFF/RF64 id and WAVE format")
+        ds64_data_size = None
+        fmt = None
+        pos = 12
+        while pos + 8 <= len(buf):
+            chunk_id = buf[pos:pos + 4]
+            chunk_size = struct.unpack_from('<I', buf, pos + 4)[0]
+            body = pos + 8
+            if chunk_id == b'ds64':
+                ds64_data_size = struct.unpack_from('<Q', buf, body + 8)[0]
+            elif chunk_id == b'fmt ':
+                fmt = buf[body:body + chunk_size]
+            elif chunk_id == b'data':
+                if fmt is None:
+                    raise wave.Error("data chunk before fmt chunk")
+                if chunk_size == RF64_SIZE_FLAG and ds64_data_size is not None:
+                    chunk_size = ds64_data_size
+                return fmt, body, chunk_size
+            pos = body + chunk_size + (chunk_size & 1)  # chunks are padded to even length
+        raise wave.Error("fmt chunk and/or data chunk missing")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Drop this object's reference to the mapping, after which reading frames raises ValueError. Pages stay
+        mapped while arrays or memoryviews returned earlier still use them, and are unmapped when the last one is
+        released."""
+        self._map = None
+        self._view = None
+
+    def _check_open(self) -> None:
+        if self._view is None:
+            raise ValueError("read of closed file")  # as from wave.Wave_read
+
+    def getnchannels(self) -> int:
+        return self._nchannels
+
+    def getsampwidth(self) -> int:
+        return self._sampwidth
+
+    def getframerate(self) -> int:
+        return self._framerate
+
+    def getnframes(self) -> int:
+        return self._nframes
+
+    def getcomptype(self) -> str:
+        return 'NONE'
+
+    def getcompname(self) -> str:
+        return 'not compressed'
+
+    def getparams(self) -> tuple:
+        return wave_params(self._nchannels, self._sampwidth, self._framerate, self._nframes,
+                           self.getcomptype(), self.getcompname())
+
+    def tell(self) -> int:
+        return self._pos
+
+    def rewind(self) -> None:
+        self._check_open()
+        self._pos = 0
+
+    def setpos(self, pos: int) -> None:
+        self._check_open()
+        if pos < 0 or pos > self._nframes:
+            raise wave.Error("position not in range")
+        self._pos = pos
+
+    def readframes(self, nframes: int) -> memoryview:
+        """Return up to `nframes` frames from the current position, without copying, and advance.
+
+        :param nframes: How many frames to read
+        :return: memoryview of raw little-endian PCM bytes
+        :raises: ValueError if the file has been closed
+        """
+        self._check_open()
+        start = self._pos
+        self._pos = min(start + max(nframes, 0), self._nframes)
+        return self._view[start * self._framewidth:self._pos * self._framewidth]
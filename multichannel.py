@@ -0,0 +1,79 @@
+import collections
+
+import numpy as np
+
+from wave_helpers import WaveData, open_wav, freq_histogram, infer_mark_space, square_up, rle, runs_to_bits
+from instrument import StageStats, stage
+
+DecodeConfig = collections.namedtuple('DecodeConfig', 'pass_lo pass_hi seg_per_symbol')
+DecodeConfig.__new__.__defaults__ = (400, 2000, 3)  # namedtuple(defaults=) needs Python 3.7
+
+
+def decode_configs(wave_data: WaveData, configs: list, stats: StageStats = None) -> dict:
+    """Decode every channel with every configuration, sharing the STFT work. Configurations with the same
+    seg_per_symbol share one STFT, computed for all channels in one batched call. Each passband is then a slice
+    (a view, not a copy) of that spectrum, so memory holds one spectrum at a time however many configurations there
+    are. Results are the same as Fourier, apply_passband() and Bitstream on each channel separately.
+
+    Example:
+    W = WaveData(fh, n_symbols_to_read=None, channel=None)
+    decode_configs(W, [DecodeConfig(400, 2000), DecodeConfig(500, 1800)])
+    -> {(0, DecodeConfig(400, 2000, 3)): array([0, 0, 0, ...]), (1, DecodeConfig(400, 2000, 3)): ..., ...}
+
+    :param wave_data: Samples of one channel, or of all channels (read with channel=None)
+    :param configs: List of DecodeConfig, or of (pass_lo, pass_hi, seg_per_symbol) tuples
+    :param stats: Record time, memory and sizes of each STFT and decode. `None` for no instrumentation.
+    :return: dict of (channel index, DecodeConfig) -> array of bits. For one-channel WaveData, the channel index is
+        wave_data.channel.
+    :raises: ValueError if some channel and configuration has no clear mark and space
+    """
+    from scipy import signal  # only when the STFT engine is actually used
+    samples = np.asarray(wave_data.int_list, dtype=np.float64)
+    channels = range(len(samples)) if samples.ndim == 2 else [wave_data.channel]
+    samples = samples.reshape(len(channels), -1)
+    configs = [DecodeConfig(*c) for c in configs]
+    samples_per_symbol = wave_data.sample_rate / wave_data.baud
+
+    by_nperseg = collections.defaultdict(list)
+    for config in configs:
+        by_nperseg[int(samples_per_symbol / config.seg_per_symbol)].append(config)
+
+    streams = {}
+    for nperseg, group in by_nperseg.items():
+        with stage(stats, 'multi.Fourier') as record:
+            f, _, zxx = signal.stft(samples, fs=wave_data.sample_rate, nperseg=nperseg)
+            magnitude = np.abs(zxx)  # channels, freqs, times
+            del zxx
+            record['zxx_shape'] = list(magnitude.shape)
+        calculated_seg_per_symbol = magnitude.shape[-1] / wave_data.n_symbols_actually_read
+        for config in group:
+            with stage(stats, 'multi.Bitstream') as record:
+                selected = np.flatnonzero((config.pass_lo < f) * (f < config.pass_hi))  # a contiguous range
+                if len(selected) == 0:
+                    raise ValueError("No STFT bins between %g and %g Hz" % (config.pass_lo, config.pass_hi))
+                max_freq_indices = magnitude[:, selected[0]:selected[-1] + 1].argmax(axis=1)
+                for channel, idx in zip(channels, max_freq_indices):
+                    high, low = infer_mark_space(freq_histogram(idx))
+                    rl, values = rle(square_up(idx, high, low))
+                    streams[channel, config] = runs_to_bits(rl, values, calculated_seg_per_symbol, high, low)
+                record['channels'] = len(channels)
+    return streams
+
+
+def multi_pipeline(infile: str = 'sample-data.wav', configs: list = (DecodeConfig(),), start_sample: int = 0,
+                   n_symbols_to_read: int = None, baud: int = 50, backend: str = 'wave',
+                   stats: StageStats = None) -> dict:
+    """Read all channels of a WAV file and decode each with each configuration. See decode_configs().
+
+    :param infile: Name of input WAV file
+    :param configs: List of DecodeConfig, or of (pass_lo, pass_hi, seg_per_symbol) tuples
+    :param start_sample: WAV file position to start reading
+    :param n_symbols_to_read: Amount of FSK symbols to read from WAV file. `None` means read it all.
+    :param baud: Symbols per second
+    :param backend: How to read the WAV file, 'wave' or 'mmap'. See open_wav().
+    :param stats: Record time, memory and sizes of each stage, see StageStats. `None` for no instrumentation.
+    :return: dict of (channel index, DecodeConfig) -> array of bits
+    """
+    with open_wav(infile, backend) as wav_file:
+        w = WaveData(wav_file, start_sample, n_symbols_to_read, baud, channel=None, stats=stats)
+    return decode_configs(w, configs, stats)
@@ -0,0 +1,67 @@
+import concurrent.futures
+import os
+
+import numpy as np
+
+from wave_helpers import open_wav, square_up, rle, freq_histogram, infer_mark_space, runs_to_bits
+from streaming import StftPlan, segment_range_indices
+
+
+def split_segments(n_segments: int, n_pieces: int) -> list:
+    """Divide FT segment indices into contiguous, nearly equal ranges.
+
+    split_segments(10, 3) -> [(0, 3), (3, 7), (7, 10)]
+
+    :param n_segments: Total number of FT segments
+    :param n_pieces: How many ranges to make (fewer if there are not enough segments)
+    :return: List of (first, last) tuples, `last` not included.
+    """
+    edges = np.linspace(0, n_segments, min(n_pieces, n_segments) + 1).round().astype(int)
+    return [(int(a), int(b)) for a, b in zip(edges[:-1], edges[1:])]
+
+
+def _piece_indices(infile: str, backend: str, plan: StftPlan, first: int, last: int,
+                   pass_lo: float, pass_hi: float, channel: int) -> np.ndarray:
+    """Worker task: open the file and detect tones for one range of segments."""
+    with open_wav(infile, backend) as wav_file:
+        idx = segment_range_indices(wav_file, plan, first, last, pass_lo, pass_hi, channel)
+    return idx.astype(np.min_scalar_type(idx.max(initial=0)))  # small dtype, to keep inter-process traffic low
+
+
+def parallel_bitstream(infile: str = 'sample-data.wav', n_workers: int = None,
+                       start_sample: int = 0, n_symbols_to_read: int = None,
+                       baud: int = 50, seg_per_symbol: int = 3, pass_lo: float = 400, pass_hi: float = 2000,
+                       backend: str = 'wave', channel: int = 0, piece_samples: int = 2 ** 22) -> np.ndarray:
+    """Decode one long WAV file using several processes. The result equals whole_pipeline(outfile=None) with the
+    same parameters, bit for bit.
+
+    The FT segments are split into time ranges, and each worker reads only the samples its range covers, including
+    the window overlap with its neighbours, and returns the frequency bin decisions. Those are stitched back in
+    order, so mark/space inference is global and runs that cross a range boundary are measured whole.
+
+    :param infile: Name of input WAV file
+    :param n_workers: Number of worker processes. `None` means one per CPU.
+    :param start_sample: WAV file position to start reading
+    :param n_symbols_to_read: Amount of FSK symbols to read from WAV file. `None` means read it all.
+    :param baud: Symbols per second, to help calculate duration of an FT window (segment)
+    :param seg_per_symbol: Number of FT segments to compute for each FSK symbol
+    :param pass_lo: Spectrum below this frequency (Hz) is ignored as neither mark nor space.
+    :param pass_hi: Spectrum above this frequency (Hz) is ignored as neither mark nor space.
+    :param backend: How to read the WAV file, 'wave' or 'mmap'. See open_wav().
+    :param channel: Which channel of a multi-channel file to decode
+    :param piece_samples: Largest time range for one task, in samples. Bounds each worker's memory.
+    :return: Array of bits.
+    """
+    with open_wav(infile, backend) as wav_file:
+        plan = StftPlan(wav_file, start_sample, n_symbols_to_read, baud, seg_per_symbol)
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    pieces = split_segments(plan.n_segments, max(n_workers, -(-plan.n_samples // piece_samples)))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=n_workers) as pool:
+        futures = [pool.submit(_piece_indices, infile, backend, plan, first, last, pass_lo, pass_hi, channel)
+                   for first, last in pieces]
+        max_freq_indices = np.concatenate([future.result() for future in futures]).astype(int)
+
+    high, low = infer_mark_space(freq_histogram(max_freq_indices))
+    rl, values = rle(square_up(max_freq_indices, high, low))
+    return runs_to_bits(rl, values, plan.seg_per_symbol, high, low)
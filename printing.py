@@ -1,5 +1,7 @@
 from typing import Generator
 
+import numpy as np
+
 
 def pretty_hex_string(hs: str, bytes_space: int = 2, bytes_newline: int = 16) -> Generator[str, None, None]:
     """Prepare hexadecimal text for easier reading.
@@ -39,3 +41,38 @@ def ints2dots(ints: list, max_int: int = 65535, max_spaces: int = 75) -> Generat
     for x in ints:
         n_spaces = int(x / max_int * max_spaces)
         yield '.' * n_spaces + 'X'
+
+
+def hex_dump(data: bytes, bytes_space: int = 2, bytes_newline: int = 16) -> str:
+    """Same text as ''.join(pretty_hex_string(data.hex())), made in one go with NumPy instead of one string per
+    character. Only pass the bytes that will be shown; the work is proportional to len(data).
+
+    hex_dump(b'\\xab\\xcd\\xef\\x01\\x23') -> 'abcd ef01 23'
+
+    :param data: Bytes, or anything that supports the buffer protocol, e.g. a memoryview
+    :param bytes_newline: How many bytes until insert newline
+    :param bytes_space: How many bytes until insert space
+    :return: Hexadecimal text with spaces and newlines added every so often.
+    """
+    chars = np.frombuffer(bytes(data).hex().encode('ascii'), dtype='S1')
+    characters_per_space = bytes_space * 2
+    characters_per_newline = bytes_newline * 2
+    ends = np.arange(characters_per_space, len(chars) + 1, characters_per_space)  # after each full group
+    ends = np.union1d(ends, np.arange(characters_per_newline, len(chars) + 1, characters_per_newline))
+    separators = np.where(ends % characters_per_newline == 0, b'\n', b' ').astype('S1')
+    return np.insert(chars, ends, separators).tobytes().decode('ascii')
+
+
+def dot_lines(ints: np.ndarray, max_int: int = 65535, max_spaces: int = 75) -> list:
+    """Same lines as list(ints2dots(ints)), but the bar lengths are computed for all values at once. Only pass the
+    values that will be shown.
+
+    dot_lines([1000, 2000, 4000]) -> ['.X', '..X', '....X']
+
+    :param ints: Array of numbers. Negative means no dots.
+    :param max_int: Value that gets max_spaces dots
+    :param max_spaces: Length of the longest bar, before the 'X'
+    :return: List of strings, one bar per value
+    """
+    n_spaces = np.maximum((np.asarray(ints, dtype=np.float64) / max_int * max_spaces).astype(np.int64), 0)
+    return ['.' * n + 'X' for n in n_spaces.tolist()]
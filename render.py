@@ -0,0 +1,157 @@
+"""Spectrogram images that take about the same time to draw however long the recording is.
+
+A spectrogram of an hour at 50 baud has over half a million time points, but an image only has a few hundred pixels
+across, so magnitudes are max-pooled to the pixel grid before drawing (max, so that short bursts stay visible).
+Figures are drawn on their own Agg canvas, not pyplot's global figure, so nothing is left open after saving.
+"""
+import os
+
+import numpy as np
+
+
+def pool_edges(n: int, n_pixels: int) -> np.ndarray:
+    """Split n values into at most n_pixels groups of (nearly) equal size.
+
+    :return: Array of start indices of each group, then n.
+    """
+    return np.unique(np.linspace(0, n, min(n, n_pixels) + 1).astype(int))
+
+
+def _pool(magnitude: np.ndarray, height: int, width: int) -> tuple:
+    """Max-pool magnitude to at most height * width, see max_pool().
+
+    :return: Tuple of (pooled magnitudes, row group edges, column group edges).
+    """
+    row_edges, col_edges = pool_edges(magnitude.shape[0], height), pool_edges(magnitude.shape[1], width)
+    pooled = np.maximum.reduceat(np.maximum.reduceat(magnitude, col_edges[:-1], axis=1), row_edges[:-1], axis=0)
+    return pooled, row_edges, col_edges
+
+
+def max_pool(magnitude: np.ndarray, f: np.ndarray, t: np.ndarray, height: int, width: int) -> tuple:
+    """Reduce a spectrogram to at most height * width values, each the maximum of the magnitudes it covers. Only
+    reads magnitude once, so a memory-mapped magnitude matrix is not loaded all at once.
+
+    :param magnitude: Magnitudes, frequencies * times
+    :param f: Frequency of each row
+    :param t: Time of each column
+    :param height: Number of rows wanted
+    :param width: Number of columns wanted
+    :return: Tuple of (pooled magnitudes, frequency of each row, time of each column). Coordinates are the middle
+        of each group.
+    """
+    pooled, row_edges, col_edges = _pool(magnitude, height, width)
+    f, t = np.asarray(f), np.asarray(t)
+    return (pooled, (f[row_edges[:-1]] + f[row_edges[1:] - 1]) / 2,
+            (t[col_edges[:-1]] + t[col_edges[1:] - 1]) / 2)
+
+
+def render_spectrogram(filename: str, f: np.ndarray, t: np.ndarray, magnitude: np.ndarray, vmax: float = None,
+                       size: tuple = (6.4, 4.8), dpi: int = 100, title: str = 'STFT Magnitude') -> None:
+    """Save a spectrogram plot, pooled to the pixel size of its axes. See max_pool().
+
+    Example:
+    render_spectrogram('x.png', F.f, F.t, F.Zxx)
+
+    :param filename: Name of the image file, in any format matplotlib knows from the extension
+    :param f: Frequency of each row
+    :param t: Time of each column
+    :param magnitude: Magnitudes, frequencies * times
+    :param vmax: Magnitude at the top of the color scale. `None` for the largest magnitude.
+    :param size: Figure size in inches, the pyplot default
+    :param dpi: Pixels per inch
+    :param title: Plot title
+    """
+    from matplotlib.figure import Figure  # only when a plot is actually drawn
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize=size, dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)  # no arguments needs matplotlib 3.1, and Python 3.5 stops at 3.0
+    box = ax.get_window_extent()
+    pooled, pooled_f, pooled_t = max_pool(magnitude, f, t, max(int(box.height), 1), max(int(box.width), 1))
+    vmax = np.max(pooled) if vmax is None else vmax  # global max just used for plot scale
+    ax.pcolormesh(pooled_t, pooled_f, pooled, vmin=0, vmax=vmax, shading='gouraud')
+    ax.set_title(title)
+    ax.set_ylabel('Frequency [Hz]')
+    ax.set_xlabel('Time [sec]')
+    fig.savefig(filename)
+    fig.clear()
+
+
+def write_image(filename: str, magnitude: np.ndarray, height: int = None, width: int = None,
+                vmax: float = None) -> tuple:
+    """Save magnitudes directly as a greyscale image, without matplotlib. Highest frequency at the top, brighter is
+    stronger. The format is binary PGM (portable graymap), which most image viewers and converters read.
+
+    :param filename: Name of the image file
+    :param magnitude: Magnitudes, frequencies * times
+    :param height: Max-pool to at most this many rows. `None` for one row per frequency.
+    :param width: Max-pool to at most this many columns. `None` for one column per time point.
+    :param vmax: Magnitude shown as white. `None` for the largest magnitude.
+    :return: Tuple of image (height, width)
+    """
+    pooled, _, _ = _pool(magnitude, height or magnitude.shape[0], width or magnitude.shape[1])
+    vmax = float(np.max(pooled)) if vmax is None else vmax
+    scale = 255 / vmax if vmax > 0 else 0
+    pixels = np.clip(np.rint(pooled[::-1] * scale), 0, 255).astype(np.uint8)
+    with open(filename, 'wb') as fh:
+        fh.write(b'P5\n%i %i\n255\n' % (pixels.shape[1], pixels.shape[0]))
+        fh.write(pixels.tobytes())
+    return pixels.shape
+
+
+class TileRenderer:
+    def __init__(self, f: np.ndarray, t: np.ndarray, magnitude: np.ndarray, directory: str,
+                 tile_seconds: float = 60, height: int = 256, width: int = 512, vmax: float = None) -> None:
+        """Render images of fixed-length stretches of a long spectrogram, only when asked for, and keep them on disk
+        so each is only rendered once. Useful for scrolling or zooming through hours of recording. Each tile only
+        reads its own columns of magnitude, which can be memory-mapped (see StftCache and formats.read_spectrogram).
+
+        Example:
+        tiles = TileRenderer(F.f, F.t, F.Zxx, 'tiles', tile_seconds=60)
+        tiles.tile(30) -> 'tiles/60s-30.pgm', the 31st minute
+        tiles.tile(0, 600) -> 'tiles/600s-0.pgm', the first 10 minutes, zoomed out
+
+        :param f: Frequency of each row
+        :param t: Time of each column
+        :param magnitude: Magnitudes, frequencies * times
+        :param directory: Where tile images are kept. Created if missing.
+        :param tile_seconds: Default duration of each tile
+        :param height: Max-pool each tile to at most this many rows
+        :param width: Max-pool each tile to at most this many columns
+        :param vmax: Magnitude shown as white in every tile. `None` for the largest magnitude, which reads all of
+            magnitude once, when the first tile is rendered.
+        """
+        self.f, self.t, self.magnitude = f, np.asarray(t), magnitude
+        self.directory = os.path.expanduser(str(directory))  # str() for pathlib paths on Python 3.5
+        os.makedirs(self.directory, exist_ok=True)
+        self.tile_seconds = tile_seconds
+        self.height, self.width = height, width
+        self.vmax = vmax  # one color scale for all tiles
+        self.n_rendered = 0
+
+    def n_tiles(self, tile_seconds: float = None) -> int:
+        """Number of tiles needed to cover the whole recording."""
+        return int(self.t[-1] // (tile_seconds or self.tile_seconds)) + 1 if len(self.t) else 0
+
+    def tile(self, index: int, tile_seconds: float = None) -> str:
+        """Return the image file of one tile, rendering it if not already on disk.
+
+        :param index: Which tile, counting from 0 at time 0
+        :param tile_seconds: Duration of the tile. `None` for the default.
+        :return: Name of the image file
+        :raises: ValueError if the tile starts after the end of the recording
+        """
+        tile_seconds = tile_seconds or self.tile_seconds
+        filename = os.path.join(self.directory, '%gs-%i.pgm' % (tile_seconds, index))
+        if os.path.exists(filename):
+            return filename
+        first, last = np.searchsorted(self.t, [index * tile_seconds, (index + 1) * tile_seconds])
+        if first >= last:
+            raise ValueError("Tile %i of %g s is past the end of the recording" % (index, tile_seconds))
+        if self.vmax is None:
+            self.vmax = float(np.max(self.magnitude))
+        tmp = filename + '.tmp'
+        write_image(tmp, self.magnitude[:, first:last], self.height, self.width, self.vmax)
+        os.replace(tmp, filename)  # so a half-written tile is never mistaken for a finished one
+        self.n_rendered += 1
+        return filename
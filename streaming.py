@@ -0,0 +1,192 @@
+import numpy as np
+import wave  # so we can refer to its classes in type hint annotations
+from scipy import signal
+from typing import Generator
+
+from wave_helpers import open_wav, bytes2samples, square_up, rle, freq_histogram, infer_mark_space, runs_to_bits
+
+
+class StftPlan:
+    """Geometry of the STFT that Fourier would compute over a whole recording, worked out from the WAV header alone,
+    so that the recording can be processed one block at a time with identical results."""
+
+    def __init__(self, wav_file: wave.Wave_read, start_sample: int = 0, n_symbols_to_read: int = None,
+                 baud: int = 50, seg_per_symbol: int = 3) -> None:
+        """Example:
+        P = StftPlan(fh)
+        P.nperseg, P.hop, P.n_segments -> 147, 74, 302
+
+        :param wav_file: Object opened by wave.open()
+        :param start_sample: Where in the file to start reading
+        :param n_symbols_to_read: How many FSK symbols to read. `None` to read whole file.
+        :param baud: Rate of FSK symbols per second
+        :param seg_per_symbol: How many FT segments are calculated for each FSK symbol.
+        """
+        self.start_sample = start_sample
+        self.sample_rate = wav_file.getframerate()
+        samples_per_symbol = self.sample_rate / baud
+        n_available = max(wav_file.getnframes() - start_sample, 0)
+        if n_symbols_to_read is not None:
+            self.n_samples = min(int(samples_per_symbol * n_symbols_to_read), n_available)
+        else:
+            self.n_samples = n_available
+        self.n_symbols = self.n_samples / self.sample_rate * baud  # same as WaveData.n_symbols_actually_read
+
+        # Same defaults as signal.stft(): half overlap, zero padding at both ends, zero padding to a whole segment.
+        self.nperseg = int(samples_per_symbol / seg_per_symbol)
+        self.hop = self.nperseg - self.nperseg // 2
+        self.edge = self.nperseg // 2
+        n_padded = self.n_samples + 2 * self.edge
+        self.tail = self.edge + (-(n_padded - self.nperseg) % self.hop) % self.nperseg
+        n_padded += self.tail - self.edge
+        if n_padded < self.nperseg:
+            raise ValueError("Only %i samples to read, too short for one %i-sample segment" %
+                             (self.n_samples, self.nperseg))
+        self.n_segments = (n_padded - self.nperseg) // self.hop + 1
+        self.seg_per_symbol = self.n_segments / self.n_symbols  # same as Bitstream.calculated_seg_per_symbol
+
+
+def stream_max_freq_indices(wav_file: wave.Wave_read, plan: StftPlan,
+                            pass_lo: float = 400, pass_hi: float = 2000,
+                            block_size: int = 2 ** 16, channel: int = 0) -> Generator[np.ndarray, None, None]:
+    """Read a WAV file a block at a time and yield the most intense passband frequency bin of each FT segment.
+    Concatenated, the blocks equal Fourier.max_freq_indices after Fourier.apply_passband(). Only one block of
+    samples plus one segment of overlap is held in memory at a time.
+
+    :param wav_file: Object opened by wave.open()
+    :param plan: STFT geometry for this file and read window
+    :param pass_lo: Spectrum below this frequency (Hz) is ignored as neither mark nor space.
+    :param pass_hi: Spectrum above this frequency (Hz) is ignored as neither mark nor space.
+    :param block_size: How many WAV frames to read at once
+    :param channel: Which channel of a multi-channel file to decode
+    :return: Yield arrays of frequency bin indices, in time order.
+    """
+    sample_width = wav_file.getsampwidth()
+    n_channels = wav_file.getnchannels()
+    wav_file.setpos(plan.start_sample)
+    carry = np.zeros(plan.edge)
+    n_left = plan.n_samples
+    finished = False
+    while not finished:
+        if n_left > 0:
+            wav_bytes = wav_file.readframes(min(block_size, n_left))
+            block = bytes2samples(wav_bytes, sample_width, n_channels, channel).astype(np.float64)
+            n_left -= len(block)
+            if len(block) == 0:
+                raise EOFError("WAV file ended %i samples early" % n_left)
+        else:
+            block = np.zeros(plan.tail)
+            finished = True
+        buf = np.concatenate((carry, block))
+        n_seg = (len(buf) - plan.nperseg) // plan.hop + 1 if len(buf) >= plan.nperseg else 0
+        if n_seg > 0:
+            f, _, zxx = signal.stft(buf[:(n_seg - 1) * plan.hop + plan.nperseg], fs=plan.sample_rate,
+                                    nperseg=plan.nperseg, boundary=None, padded=False)
+            selected_indices = ((pass_lo < f) * (f < pass_hi))
+            yield np.abs(zxx[selected_indices]).argmax(0)
+        carry = buf[n_seg * plan.hop:]
+
+
+def segment_range_indices(wav_file: wave.Wave_read, plan: StftPlan, first: int, last: int,
+                          pass_lo: float = 400, pass_hi: float = 2000, channel: int = 0) -> np.ndarray:
+    """Compute the most intense passband frequency bin for FT segments `first` up to (not including) `last` only,
+    reading just the samples those segments cover. Equal to the same slice of Fourier.max_freq_indices after
+    Fourier.apply_passband(), so separate ranges can be computed independently and concatenated.
+
+    :param wav_file: Object opened by wave.open()
+    :param plan: STFT geometry for this file and read window
+    :param first: Index of first FT segment
+    :param last: Index after the last FT segment
+    :param pass_lo: Spectrum below this frequency (Hz) is ignored as neither mark nor space.
+    :param pass_hi: Spectrum above this frequency (Hz) is ignored as neither mark nor space.
+    :param channel: Which channel of a multi-channel file to decode
+    :return: Array of frequency bin indices, one per segment.
+    :raises: ValueError if the range is empty or outside the plan
+    """
+    if not 0 <= first < last <= plan.n_segments:
+        raise ValueError("Segments %i to %i requested, plan has %i" % (first, last, plan.n_segments))
+    # Segment j covers padded samples [j * hop, j * hop + nperseg), and the padding puts `edge` zeros in front.
+    lo = first * plan.hop - plan.edge
+    hi = (last - 1) * plan.hop + plan.nperseg - plan.edge
+    read_lo = max(lo, 0)
+    read_hi = min(hi, plan.n_samples)
+    wav_file.setpos(plan.start_sample + read_lo)
+    block = bytes2samples(wav_file.readframes(read_hi - read_lo), wav_file.getsampwidth(), wav_file.getnchannels(),
+                          channel)
+    buf = np.zeros(hi - lo)
+    buf[read_lo - lo:read_lo - lo + len(block)] = block
+    f, _, zxx = signal.stft(buf, fs=plan.sample_rate, nperseg=plan.nperseg, boundary=None, padded=False)
+    selected_indices = ((pass_lo < f) * (f < pass_hi))
+    return np.abs(zxx[selected_indices]).argmax(0)
+
+
+def stream_bitstream(wav_file: wave.Wave_read, start_sample: int = 0, n_symbols_to_read: int = None,
+                     baud: int = 50, seg_per_symbol: int = 3, pass_lo: float = 400, pass_hi: float = 2000,
+                     mark_space: tuple = None, block_size: int = 2 ** 16,
+                     channel: int = 0) -> Generator[np.ndarray, None, None]:
+    """Decode a WAV file to bits in bounded memory. Concatenated, the yielded blocks equal the stream from
+    whole_pipeline() with the same parameters, bit for bit.
+
+    Like Bitstream, mark and space are inferred from a histogram over the whole read window, which costs one extra
+    pass over the file. Pass `mark_space` to skip that pass when the tones are already known.
+
+    Example:
+    bits = np.concatenate(list(stream_bitstream(fh)))
+
+    :param wav_file: Object opened by wave.open()
+    :param start_sample: Where in the file to start reading
+    :param n_symbols_to_read: How many FSK symbols to read. `None` to read whole file.
+    :param baud: Rate of FSK symbols per second
+    :param seg_per_symbol: How many FT segments are calculated for each FSK symbol.
+    :param pass_lo: Spectrum below this frequency (Hz) is ignored as neither mark nor space.
+    :param pass_hi: Spectrum above this frequency (Hz) is ignored as neither mark nor space.
+    :param mark_space: Tuple of (high, low) frequency bin indices, or `None` to infer them.
+    :param block_size: How many WAV frames to read at once
+    :param channel: Which channel of a multi-channel file to decode
+    :return: Yield arrays of bits, in time order.
+    """
+    plan = StftPlan(wav_file, start_sample, n_symbols_to_read, baud, seg_per_symbol)
+    if mark_space is None:
+        counts = sum(freq_histogram(idx) for idx in
+                     stream_max_freq_indices(wav_file, plan, pass_lo, pass_hi, block_size, channel))
+        mark_space = infer_mark_space(counts)
+    high, low = mark_space
+
+    # A run is only complete once a different value follows it, so always hold back the last run of each block.
+    pending_value, pending_length = None, 0
+    for idx in stream_max_freq_indices(wav_file, plan, pass_lo, pass_hi, block_size, channel):
+        rl, values = rle(square_up(idx, high, low))
+        if rl is None:
+            continue
+        if pending_value is not None:
+            if values[0] == pending_value:
+                rl[0] += pending_length
+            else:
+                rl = np.append(pending_length, rl)
+                values = np.append(pending_value, values)
+        pending_value, pending_length = values[-1], rl[-1]
+        if len(rl) > 1:
+            yield runs_to_bits(rl[:-1], values[:-1], plan.seg_per_symbol, high, low)
+    if pending_value is not None:
+        yield runs_to_bits(np.array([pending_length]), np.array([pending_value]), plan.seg_per_symbol, high, low)
+
+
+def stream_pipeline(infile: str = 'sample-data.wav', start_sample: int = 0, n_symbols_to_read: int = None,
+                    baud: int = 50, seg_per_symbol: int = 3, pass_lo: float = 400, pass_hi: float = 2000,
+                    block_size: int = 2 ** 16, backend: str = 'wave') -> Generator[np.ndarray, None, None]:
+    """Streaming counterpart of whole_pipeline(outfile=None), for recordings too long to hold in memory.
+
+    :param infile: Name of input WAV file
+    :param start_sample: WAV file position to start reading
+    :param n_symbols_to_read: Amount of FSK symbols to read from WAV file. `None` means read it all.
+    :param baud: Symbols per second, to help calculate duration of an FT window (segment)
+    :param seg_per_symbol: Number of FT segments to compute for each FSK symbol
+    :param pass_lo: Spectrum below this frequency (Hz) is ignored as neither mark nor space.
+    :param pass_hi: Spectrum above this frequency (Hz) is ignored as neither mark nor space.
+    :param block_size: How many WAV frames to read at once
+    :param backend: How to read the WAV file, 'wave' or 'mmap'. See open_wav().
+    :return: Yield arrays of bits, in time order.
+    """
+    with open_wav(infile, backend) as wav_file:
+        yield from stream_bitstream(wav_file, start_sample, n_symbols_to_read, baud, seg_per_symbol,
+                                    pass_lo, pass_hi, block_size=block_size)
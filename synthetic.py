@@ -0,0 +1,129 @@
+import numpy as np
+import wave
+
+
+def random_bits(n_bits: int, seed: int = None, idle_bits: int = 5) -> np.ndarray:
+    """Make a random bitstream, with a few idle (mark, 1) bits at each end like a real transmission.
+
+    :param n_bits: Number of random bits
+    :param seed: Seed for the random generator, so the same bits can be made again
+    :param idle_bits: Number of 1 bits to add at the start and at the end
+    :return: Array of 0 and 1, of length n_bits + 2 * idle_bits.
+    """
+    rng = np.random.default_rng(seed)
+    idle = np.ones(idle_bits, dtype=int)
+    return np.concatenate((idle, rng.integers(0, 2, n_bits), idle))
+
+
+def samples2bytes(samples: np.ndarray, sample_width: int = 2) -> bytes:
+    """Encode offset-unsigned integer samples as little-endian PCM. The inverse of bytes2samples() for one channel.
+
+    :param samples: Array of ints, 0 to 2 ** (8 * sample_width) - 1
+    :param sample_width: Bytes per sample, 1 to 4
+    :return: bytes ready for writeframes()
+    :raises: ValueError if sample_width is unsupported
+    """
+    if sample_width not in (1, 2, 3, 4):
+        raise ValueError("Unsupported sample width: %s bytes" % str(sample_width))
+    samples = np.asarray(samples, dtype=np.uint32)
+    if sample_width == 1:
+        return samples.astype(np.uint8).tobytes()  # 8-bit WAV is stored offset-unsigned
+    signed = samples ^ np.uint32(1 << (8 * sample_width - 1))  # flip sign bit == subtract midpoint, mod 2**bits
+    return signed.astype('<u4').view(np.uint8).reshape(-1, 4)[:, :sample_width].tobytes()
+
+
+def fsk_samples(bits: np.ndarray, first_sample: int = 0, phase: float = 0.0, baud: float = 50,
+                mark: float = 1500, space: float = 600, sample_rate: int = 22050, sample_width: int = 2,
+                amplitude: float = 0.5, noise: float = 0.0, rng: np.random.Generator = None) -> tuple:
+    """Synthesize phase-continuous binary FSK for a run of bits, as offset-unsigned integer samples.
+
+    :param bits: Array of 0 (space) and 1 (mark)
+    :param first_sample: Index in the whole recording of the first sample, so chunks line up with symbol timing
+    :param phase: Phase (radians) of the tone at the sample before first_sample, to continue from a previous chunk
+    :param baud: Symbols per second
+    :param mark: Tone frequency (Hz) for 1
+    :param space: Tone frequency (Hz) for 0
+    :param sample_rate: Samples per second
+    :param sample_width: Bytes per sample, 1 to 4
+    :param amplitude: Tone amplitude, as a fraction of full scale
+    :param noise: Standard deviation of added white Gaussian noise, as a fraction of full scale
+    :param rng: Random generator for the noise
+    :return: Tuple of (array of samples, phase after the last sample).
+    """
+    samples_per_symbol = sample_rate / baud
+    first_symbol = int(round(first_sample / samples_per_symbol))
+    n = np.arange(first_sample, int(round((first_symbol + len(bits)) * samples_per_symbol)))
+    symbol = np.clip((n / samples_per_symbol).astype(int) - first_symbol, 0, len(bits) - 1)
+    freq = np.where(np.asarray(bits)[symbol] == 1, mark, space)
+    phases = phase + np.cumsum(2 * np.pi * freq / sample_rate)
+    wave_form = amplitude * np.sin(phases)
+    if noise > 0:
+        rng = np.random.default_rng() if rng is None else rng
+        wave_form += rng.normal(0, noise, len(wave_form))
+    full_scale = 2 ** (8 * sample_width - 1)
+    samples = np.clip(np.round(wave_form * full_scale) + full_scale, 0, 2 * full_scale - 1).astype(np.uint32)
+    return samples, (phases[-1] if len(phases) else phase)
+
+
+def write_fsk_wav(filename: str, bits: np.ndarray, baud: float = 50, mark: float = 1500, space: float = 600,
+                  sample_rate: int = 22050, sample_width: int = 2, amplitude: float = 0.5, noise: float = 0.0,
+                  seed: int = None, chunk_bits: int = 10000) -> None:
+    """Write a known bitstream as binary FSK to a mono WAV file, a chunk at a time, so hours of audio can be made
+    in bounded memory.
+
+    Example:
+    bits = random_bits(3000, seed=1)
+    write_fsk_wav('test.wav', bits, noise=0.2)
+    bit_error_rate(whole_pipeline('test.wav', outfile=None), bits)
+
+    :param filename: Name of output WAV file
+    :param bits: Array of 0 (space) and 1 (mark)
+    :param baud: Symbols per second
+    :param mark: Tone frequency (Hz) for 1
+    :param space: Tone frequency (Hz) for 0
+    :param sample_rate: Samples per second
+    :param sample_width: Bytes per sample, 1 to 4
+    :param amplitude: Tone amplitude, as a fraction of full scale
+    :param noise: Standard deviation of added white Gaussian noise, as a fraction of full scale
+    :param seed: Seed for the noise generator
+    :param chunk_bits: How many bits to synthesize at once
+    """
+    rng = np.random.default_rng(seed)
+    samples_per_symbol = sample_rate / baud
+    phase = 0.0
+    with wave.open(str(filename), 'w') as fh:
+        fh.setnchannels(1)
+        fh.setsampwidth(sample_width)
+        fh.setframerate(sample_rate)
+        for i in range(0, len(bits), chunk_bits):
+            samples, phase = fsk_samples(bits[i:i + chunk_bits], int(round(i * samples_per_symbol)), phase, baud,
+                                         mark, space, sample_rate, sample_width, amplitude, noise, rng)
+            fh.writeframes(samples2bytes(samples, sample_width))
+
+
+def make_fsk_wav(filename: str, duration: float, seed: int = None, baud: float = 50, **kwargs) -> np.ndarray:
+    """Write random FSK of a given duration to a WAV file.
+
+    :param filename: Name of output WAV file
+    :param duration: Length of the recording in seconds
+    :param seed: Seed for the bits and the noise
+    :param baud: Symbols per second
+    :param kwargs: Other parameters of write_fsk_wav(), like mark, space, sample_rate, sample_width, noise
+    :return: The bits that were written, for checking a decode against.
+    """
+    bits = random_bits(max(int(duration * baud) - 10, 0), seed)
+    write_fsk_wav(filename, bits, baud=baud, seed=seed, **kwargs)
+    return bits
+
+
+def bit_error_rate(decoded: np.ndarray, sent: np.ndarray) -> float:
+    """Fraction of sent bits not decoded correctly. Bits are compared position by position, and each missing or
+    extra bit counts as one error.
+
+    :param decoded: Array of decoded bits
+    :param sent: Array of bits that were sent
+    :return: Error count divided by number of sent bits.
+    """
+    n = min(len(decoded), len(sent))
+    errors = np.count_nonzero(np.asarray(decoded[:n]) != np.asarray(sent[:n])) + abs(len(decoded) - len(sent))
+    return errors / max(len(sent), 1)
@@ -0,0 +1,49 @@
+import pytest
+import json
+import shutil
+
+from wave_helpers import whole_pipeline
+from formats import read_bitstream
+from batch import find_wav_files, run_batch, main
+
+
+def test_batch(tmp_path):
+    indir = tmp_path / 'in'
+    (indir / 'sub').mkdir(parents=True)
+    for name in ['a.wav', 'b.wav', 'sub/c.wav']:
+        shutil.copy('sample-data.wav', str(indir / name))
+    (indir / 'corrupt.wav').write_bytes(b'RIFF\x10\x00\x00\x00WAVEjunk')
+    (indir / 'notes.txt').write_text('not audio')
+
+    assert len(find_wav_files([str(indir)])) == 3
+    assert len(find_wav_files([str(indir)], '**/*.wav')) == 4
+    assert len(find_wav_files([str(indir / '*.wav'), str(indir / 'a.wav')])) == 3
+
+    outdir = tmp_path / 'out'
+    records = run_batch(find_wav_files([str(indir)], '**/*.wav'), str(outdir), n_workers=2)
+    assert len(records) == 4
+    by_name = {r['infile'].split('/')[-1]: r for r in records}
+    assert by_name['corrupt.wav']['error'] is not None
+
+    expected = whole_pipeline(outfile=None)
+    for name in ['a.wav', 'b.wav', 'c.wav']:
+        r = by_name[name]
+        assert r['error'] is None
+        assert (r['mark_bin'], r['space_bin'], r['mark_hz'], r['space_hz']) == (7, 1, 1500, 600)
+        assert r['n_bits'] == len(expected) and r['n_undecided'] == 0
+        stream, meta = read_bitstream(r['outfile'])
+        assert list(stream) == list(expected)
+        assert meta['infile'] == r['infile'] and meta['mark_hz'] == 1500
+        assert [s['stage'] for s in r['stages']] == ['WaveData', 'Fourier', 'apply_passband', 'Bitstream']
+
+    manifest = [json.loads(line) for line in (outdir / 'manifest.jsonl').read_text().splitlines()]
+    assert sorted(r['infile'] for r in manifest) == sorted(r['infile'] for r in records)
+
+    with pytest.raises(ValueError):
+        run_batch([str(indir / 'a.wav'), str(indir / 'sub' / 'a.wav')], str(outdir))
+
+
+def test_batch_cli(tmp_path, capsys):
+    records = main(['sample-data.wav', '-o', str(tmp_path), '-j', '1', '--detector', 'goertzel', '--backend', 'mmap'])
+    assert len(records) == 1 and records[0]['error'] is None
+    assert 'Decoded 1 of 1 files' in capsys.readouterr().out
@@ -0,0 +1,100 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from wave_helpers import whole_pipeline, run_stages
+from cache import StftCache
+from instrument import StageStats
+
+
+def test_cache_same_result(tmp_path):
+    c = StftCache(tmp_path)
+    expected = whole_pipeline(outfile=None)
+    assert np.array_equal(whole_pipeline(outfile=None, cache=c), expected)  # miss
+    s = StageStats()
+    assert np.array_equal(whole_pipeline(outfile=None, cache=c, stats=s), expected)  # hit
+    hits = {r['stage']: r['hit'] for r in s.records if r['stage'].startswith('cache.')}
+    assert hits == {'cache.WaveData': True, 'cache.Fourier': True}
+    assert 'Fourier' not in [r['stage'] for r in s.records]
+
+
+@pytest.mark.parametrize('decision, zxx_dtype', [('hard', None), ('soft', None), ('soft', 'uint8')])
+def test_cache_hit_equals_miss(tmp_path, decision, zxx_dtype):
+    c = StftCache(str(tmp_path))
+    w, f, b = run_stages(cache=c, decision=decision, zxx_dtype=zxx_dtype)  # miss
+    w2, f2, b2 = run_stages(cache=c, decision=decision, zxx_dtype=zxx_dtype)  # hit
+    assert f.Zxx.dtype == f2.Zxx.dtype and np.array_equal(f.Zxx, f2.Zxx)
+    assert np.array_equal(b.stream, b2.stream)
+    if decision == 'soft':
+        assert np.array_equal(b.llr, b2.llr)
+
+
+def test_cache_passband_change(tmp_path):
+    c = StftCache(tmp_path)
+    whole_pipeline(outfile=None, cache=c)
+    w, f, b = run_stages(pass_lo=500, pass_hi=1800, cache=c)
+    w2, f2, b2 = run_stages(pass_lo=500, pass_hi=1800)
+    assert np.array_equal(f.f, f2.f)
+    assert np.array_equal(f.Zxx, f2.Zxx.astype(np.float32))  # magnitudes are cached as float32
+    assert np.array_equal(b.stream, b2.stream)
+    assert np.array_equal(w.int_list, w2.int_list)
+
+    # Framing changes are new entries
+    whole_pipeline(outfile=None, cache=c, seg_per_symbol=4)
+    whole_pipeline(outfile=None, cache=c, n_symbols_to_read=20)
+    assert len([d for d in os.listdir(str(tmp_path)) if d.startswith('Fourier-')]) == 3
+
+
+def test_cache_report(tmp_path, capsys):
+    c = StftCache(tmp_path)
+    whole_pipeline(outfile=str(tmp_path / 'a.png'), cache=c)
+    first = capsys.readouterr().out
+    whole_pipeline(outfile=str(tmp_path / 'b.png'), cache=c)
+    assert capsys.readouterr().out == first
+
+
+def test_cache_eviction(tmp_path):
+    c = StftCache(tmp_path, max_bytes=2 ** 40)
+    whole_pipeline(outfile=None, cache=c)
+    one_run = c.size()
+    first_fourier = [k for k in c._read_index()['entries'] if k.startswith('Fourier-')]
+    c.max_bytes = one_run
+    whole_pipeline(outfile=None, cache=c, seg_per_symbol=4)  # WaveData is a hit, so the old spectrum is the LRU
+    assert c.size() <= c.max_bytes
+    entries = c._read_index()['entries']
+    assert sorted(entries) == sorted(d for d in os.listdir(str(tmp_path)) if not d.endswith('.json'))
+    assert first_fourier[0] not in entries
+    assert len([k for k in entries if k.startswith('Fourier-')]) == 1
+
+
+def test_file_hash(tmp_path):
+    c = StftCache(tmp_path / 'cache')
+    infile = tmp_path / 'x.wav'
+    infile.write_bytes(b'abc')
+    h = c.file_hash(str(infile))
+    assert c.file_hash(str(infile)) == h
+    infile.write_bytes(b'abcd')
+    assert c.file_hash(str(infile)) != h
+
+
+def test_index_lock(tmp_path):
+    c = StftCache(tmp_path / 'cache')
+    infiles = [tmp_path / ('%i.wav' % i) for i in range(8)]
+    for i, infile in enumerate(infiles):
+        infile.write_bytes(bytes([i]) * 100)
+    threads = [threading.Thread(target=c.file_hash, args=(str(infile),)) for infile in infiles]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(c._read_index()['hashes']) == len(infiles)  # no update lost
+    assert not os.path.exists(c.lock_file)
+
+    open(c.lock_file, 'w').close()  # left by a process that died
+    os.utime(c.lock_file, (time.time() - 120, time.time() - 120))
+    (tmp_path / 'x.wav').write_bytes(b'x')
+    c.file_hash(str(tmp_path / 'x.wav'))
+    assert len(c._read_index()['hashes']) == len(infiles) + 1
@@ -0,0 +1,79 @@
+import os
+
+import numpy as np
+import pytest
+
+from wave_helpers import whole_pipeline, run_stages
+from formats import (pack_stream, unpack_stream, write_bitstream, read_bitstream, quantize, dequantize,
+                     write_spectrogram, read_spectrogram, write_arrays, read_arrays)
+
+
+@pytest.mark.parametrize('encoding', ['packbits', 'runs'])
+def test_bitstream_round_trip(tmp_path, encoding):
+    stream = whole_pipeline(outfile=None)
+    stream[[3, 40]] = [5, 6]  # undecided runs must survive too
+    filename = str(tmp_path / 'x.fsk')
+    size = write_bitstream(filename, stream, encoding, infile='sample-data.wav', baud=50)
+    stream2, meta = read_bitstream(filename)
+    assert np.array_equal(stream2, stream)
+    assert meta['n_bits'] == len(stream) and meta['baud'] == 50 and meta['encoding'] == encoding
+    assert size == os.path.getsize(filename)
+
+
+def test_bitstream_meta_overlap(tmp_path):
+    # Metadata carried over from another file may hold the format's own keys, which must not clash.
+    stream = whole_pipeline(outfile=None)
+    filename = str(tmp_path / 'x.fsk')
+    write_bitstream(filename, stream, 'packbits', n_bits=1, baud=50)
+    stream2, meta = read_bitstream(filename)
+    assert np.array_equal(stream2, stream)
+    assert meta['encoding'] == 'packbits' and meta['n_bits'] == len(stream) and meta['baud'] == 50
+
+
+def test_bitstream_size_reduction():
+    stream = np.random.default_rng(0).integers(0, 2, 100000)
+    assert stream.nbytes / sum(a.nbytes for a in pack_stream(stream).arrays.values()) >= 60
+    idle = np.repeat(np.arange(1000) % 2, np.random.default_rng(1).integers(1, 200, 1000))  # long runs
+    packed = pack_stream(idle, 'runs')
+    assert np.array_equal(unpack_stream(packed), idle)
+    assert idle.nbytes / sum(a.nbytes for a in packed.arrays.values()) >= 64
+
+
+def test_pipeline_bits_format():
+    stream = whole_pipeline(outfile=None)
+    for encoding in ('packbits', 'runs'):
+        assert np.array_equal(unpack_stream(whole_pipeline(outfile=None, bits_format=encoding)), stream)
+
+
+@pytest.mark.parametrize('dtype, reduction', [('float32', 2), ('uint16', 4), ('uint8', 8)])
+def test_spectrogram_round_trip(tmp_path, dtype, reduction):
+    w, f, b = run_stages()
+    w2, f2, b2 = run_stages(zxx_dtype=dtype)
+    assert np.array_equal(b2.stream, b.stream)
+    assert f2.Zxx.dtype == np.dtype(dtype) and f.Zxx.nbytes == reduction * f2.Zxx.nbytes
+    assert np.max(np.abs(dequantize(f2.Zxx, f2.zxx_scale) - f.Zxx)) <= f2.zxx_scale / 2 + 1e-3 * np.max(f.Zxx)
+
+    filename = str(tmp_path / 'x.fsks')
+    write_spectrogram(filename, f2.f, f2.t, f2.Zxx, scale=f2.zxx_scale, baud=50)
+    for mmap in (False, True):
+        freqs, times, magnitude, meta = read_spectrogram(filename, mmap=mmap)
+        assert np.array_equal(freqs, f.f) and np.array_equal(times, f.t) and np.array_equal(magnitude, f2.Zxx)
+        assert meta == {'baud': 50, 'scale': f2.zxx_scale}
+
+
+def test_quantize_zeros():
+    codes, scale = quantize(np.zeros((3, 4)), 'uint8')
+    assert not codes.any() and scale == 1.0
+    with pytest.raises(ValueError):
+        quantize(np.zeros(3), 'int8')
+
+
+def test_read_arrays_errors(tmp_path):
+    filename = str(tmp_path / 'x.fsk')
+    with open(filename, 'wb') as fh:
+        fh.write(b'RIFF....')
+    with pytest.raises(ValueError):
+        read_arrays(filename)
+    write_arrays(filename, 'bitstream', {'a': np.arange(3)})
+    with pytest.raises(ValueError):
+        read_spectrogram(filename)
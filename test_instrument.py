@@ -0,0 +1,79 @@
+import json
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from instrument import StageStats, stage
+from wave_helpers import whole_pipeline
+
+
+def test_pipeline_stats():
+    seen = []
+    stats = StageStats(callback=seen.append)
+    stream = whole_pipeline(outfile=None, stats=stats)
+    assert np.array_equal(stream, whole_pipeline(outfile=None))
+    assert [r['stage'] for r in stats.records] == ['WaveData', 'Fourier', 'apply_passband', 'Bitstream']
+    assert seen == stats.records
+    by_stage = {r['stage']: r for r in stats.records}
+    assert by_stage['WaveData']['samples_read'] == 22227
+    assert by_stage['Fourier']['zxx_shape'] == [74, 302]
+    assert by_stage['apply_passband']['zxx_shape'] == [11, 302]
+    assert by_stage['Bitstream']['segments'] == 302 and by_stage['Bitstream']['bits'] == len(stream)
+    assert all(r['wall_seconds'] >= 0 and r['cpu_seconds'] >= 0 and 'peak_bytes' not in r for r in stats.records)
+    assert stats.totals()['Fourier']['count'] == 1
+
+    stats = StageStats()
+    whole_pipeline(outfile='plot_default.png', stats=stats, detector='goertzel')
+    assert [r['stage'] for r in stats.records] == ['WaveData', 'Goertzel', 'apply_passband', 'Bitstream', 'report']
+
+
+@pytest.mark.parametrize('reset_peak', [True, False])
+def test_trace_memory(monkeypatch, reset_peak):
+    if not reset_peak:
+        monkeypatch.delattr(tracemalloc, 'reset_peak', raising=False)  # as on Python < 3.9
+    stats = StageStats(trace_memory=True)
+    with stats.stage('outer'):
+        a = np.ones(100000)
+        with stats.stage('inner') as record:
+            b = np.ones(200000)
+            record['n'] = len(b)
+            del b
+        del a
+    inner, outer = stats.records
+    assert inner['stage'] == 'inner' and inner['n'] == 200000
+    assert 1600000 <= inner['peak_bytes'] < 1700000
+    assert outer['peak_bytes'] >= 800000 + inner['peak_bytes']  # inner's peak happened while outer held `a`
+    assert not tracemalloc.is_tracing()
+
+
+@pytest.mark.parametrize('reset_peak', [True, False])
+def test_trace_memory_keeps_callers_tracing(monkeypatch, reset_peak):
+    if not reset_peak:
+        monkeypatch.delattr(tracemalloc, 'reset_peak', raising=False)  # as on Python < 3.9
+    tracemalloc.start(5)
+    try:
+        before = np.ones(100000)
+        stats = StageStats(trace_memory=True)
+        with stats.stage('outer'):
+            with stats.stage('inner'):
+                a = np.ones(200000)
+                del a
+        assert tracemalloc.is_tracing() and tracemalloc.get_traceback_limit() == 5
+        assert tracemalloc.get_object_traceback(before) is not None  # still traced, not restarted
+        assert 1600000 <= stats.records[0]['peak_bytes'] < 1700000
+    finally:
+        tracemalloc.stop()
+
+
+def test_disabled_and_jsonl(tmp_path):
+    with stage(None, 'nothing') as record:
+        record['n'] = 1  # goes nowhere
+    stats = StageStats()
+    whole_pipeline(outfile=None, stats=stats)
+    out = tmp_path / 'stats.jsonl'
+    stats.write_jsonl(str(out), run_id=1)
+    stats.write_jsonl(str(out), run_id=2)
+    lines = [json.loads(line) for line in out.read_text().splitlines()]
+    assert len(lines) == 8
+    assert lines[0]['run_id'] == 1 and lines[-1]['run_id'] == 2 and lines[-1]['stage'] == 'Bitstream'
@@ -0,0 +1,89 @@
+import io
+import os
+import threading
+import time
+import wave
+
+import numpy as np
+import pytest
+
+from wave_helpers import whole_pipeline, bytes2samples
+from live import LiveDecoder, LiveStats, RingBuffer, live_bitstream, replay_wav
+from synthetic import random_bits, fsk_samples, bit_error_rate
+
+
+def sample_data():
+    with wave.open('sample-data.wav', 'r') as fh:
+        return fh.readframes(fh.getnframes())
+
+
+@pytest.mark.parametrize('chunk', [1, 74, 1000, 30000])
+def test_live_decoder_chunks(chunk):
+    samples = bytes2samples(sample_data())
+    d = LiveDecoder()
+    out = [d.feed(samples[i:i + chunk]) for i in range(0, len(samples), chunk)] + [d.flush()]
+    bits = np.concatenate([b for b, _ in out])
+    ends = np.concatenate([e for _, e in out])
+    assert np.array_equal(bits, whole_pipeline(outfile=None))
+    assert np.all(np.diff(ends) > 0) and ends[-1] <= len(samples)
+
+
+def test_live_decoder_adapts():
+    # The tones move halfway through. Bitstream's one histogram would pick two of the four.
+    bits = random_bits(3000, seed=5)
+    rng = np.random.default_rng(1)
+    first, phase = fsk_samples(bits[:1500], noise=0.1, rng=rng)
+    second, _ = fsk_samples(bits[1500:], len(first), phase, mark=1800, space=950, noise=0.1, rng=rng)
+    samples = np.concatenate((first, second))
+    d = LiveDecoder()
+    out = [d.feed(samples[i:i + 2205]) for i in range(0, len(samples), 2205)] + [d.flush()]
+    decoded = np.concatenate([b for b, _ in out])
+    assert bit_error_rate(decoded[:1400], bits[:1400]) == 0
+    assert bit_error_rate(decoded[-1000:], bits[-1000:]) == 0
+
+
+def test_ring_buffer():
+    ring = RingBuffer(10)
+    ring.write(np.arange(6), 1.0)
+    assert ring.read()[1] == 0
+    ring.write(np.arange(6, 12), 2.0)
+    ring.write(np.arange(12, 18), 3.0)  # 2 unread samples overwritten
+    samples, start = ring.read()
+    assert start == 8 and np.array_equal(samples, np.arange(8, 18))
+    assert ring.blocks_dropped == 1 and ring.samples_dropped == 2
+    assert ring.arrival_times(np.array([0, 6, 11, 17])).tolist() == [1.0, 2.0, 2.0, 3.0]
+    ring.close()
+    assert ring.read() is None
+
+
+@pytest.mark.parametrize('speed', [1.0, 20.0])
+def test_replay(speed):
+    read_fd, write_fd = os.pipe()
+
+    def replay():
+        with os.fdopen(write_fd, 'wb') as out:
+            replay_wav('sample-data.wav', out, speed, block_frames=512)
+    threading.Thread(target=replay, daemon=True).start()
+
+    stats = LiveStats(latency_budget=3 / 50)
+    t0 = time.monotonic()
+    with os.fdopen(read_fd, 'rb') as fh:
+        bits = np.concatenate(list(live_bitstream(fh, stats=stats)))
+    elapsed = time.monotonic() - t0
+    assert np.array_equal(bits, whole_pipeline(outfile=None))
+    assert elapsed > 22227 / 22050 / speed * 0.9
+    s = stats.summary()
+    assert s['blocks_read'] > 0 and s['blocks_dropped'] == 0 and s['bits'] == len(bits)
+    assert s['latency_median'] <= s['latency_budget']
+
+
+def test_dropped_blocks():
+    fh = io.BytesIO(sample_data() * 4)
+    stats = LiveStats(latency_budget=3 / 50)
+    n_bits = 0
+    for bits in live_bitstream(fh, block_frames=1024, ring_seconds=0.05, stats=stats):
+        n_bits += len(bits)
+        time.sleep(0.05)  # a decoder too slow for the input
+    assert stats.blocks_dropped > 0 and stats.samples_dropped > 0
+    assert stats.blocks_read == -(-len(fh.getvalue()) // 2048)
+    assert stats.bits == n_bits
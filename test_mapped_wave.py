@@ -0,0 +1,112 @@
+import pytest
+import numpy as np
+import struct
+import wave
+
+from mapped_wave import MappedWave, WAVE_FORMAT_PCM, WAVE_FORMAT_EXTENSIBLE
+from wave_helpers import WaveData, bytes2samples, whole_pipeline, open_wav
+from streaming import stream_pipeline
+
+PCM_GUID_TAIL = b'\x00\x00\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71'
+
+
+def chunk(chunk_id: bytes, body: bytes, size: int = None) -> bytes:
+    size = len(body) if size is None else size
+    return chunk_id + struct.pack('<I', size) + body + b'\x00' * (len(body) & 1)
+
+
+def fmt_body(format_tag, n_channels, sample_rate, sample_width, extensible_subformat=None) -> bytes:
+    block_align = n_channels * sample_width
+    body = struct.pack('<HHIIHH', format_tag, n_channels, sample_rate, sample_rate * block_align, block_align,
+                       8 * sample_width)
+    if extensible_subformat is not None:
+        body += struct.pack('<HHIH', 22, 8 * sample_width, 0x3, extensible_subformat) + PCM_GUID_TAIL
+    return body
+
+
+def test_same_as_wave_module():
+    with wave.open('sample-data.wav', 'r') as fh, MappedWave('sample-data.wav') as m:
+        assert tuple(m.getparams()) == tuple(fh.getparams())
+        assert len(m.data) == m.getnframes() * m.getsampwidth()
+        assert m.readframes(10) == fh.readframes(10)
+        fh.setpos(20000)
+        m.setpos(20000)
+        assert m.readframes(5000) == fh.readframes(5000)  # runs off the end
+        assert m.tell() == fh.tell() == fh.getnframes()
+        assert len(m.readframes(10)) == 0
+        with pytest.raises(wave.Error):
+            m.setpos(m.getnframes() + 1)
+
+
+def test_zero_copy_read_only():
+    with MappedWave('sample-data.wav') as m:
+        frames = m.readframes(100)
+        samples = np.frombuffer(frames, dtype='<u2')
+        assert np.shares_memory(samples, m.data)
+        assert not m.data.flags.writeable
+        with pytest.raises(ValueError):
+            m.data[0] = 0
+    assert samples[0] == np.frombuffer(b'#\xff', dtype='<u2')[0]  # still mapped after close
+    for read in (lambda: m.readframes(1), m.rewind, lambda: m.setpos(0)):
+        with pytest.raises(ValueError):
+            read()
+
+
+def test_wavedata_and_pipeline_backends():
+    with wave.open('sample-data.wav', 'r') as fh:
+        w1 = WaveData(fh, start_sample=1000, n_symbols_to_read=20)
+    with open_wav('sample-data.wav', 'mmap') as m:
+        w2 = WaveData(m, start_sample=1000, n_symbols_to_read=20)
+    assert np.array_equal(w1.int_list, w2.int_list)
+    assert w1.n_symbols_actually_read == w2.n_symbols_actually_read
+    w2.print_summary()
+
+    expected = whole_pipeline(outfile=None)
+    assert np.array_equal(whole_pipeline(outfile=None, backend='mmap'), expected)
+    assert np.array_equal(np.concatenate(list(stream_pipeline(backend='mmap', block_size=1000))), expected)
+    with pytest.raises(ValueError):
+        open_wav('sample-data.wav', 'nope')
+
+
+def test_extensible_and_extra_chunks(tmp_path):
+    # Stereo 24-bit WAVE_FORMAT_EXTENSIBLE, with an odd-sized chunk that needs a pad byte before the data.
+    frames = np.array([[1, -1], [2, -2], [8388607, -8388608]], dtype='<i4')
+    pcm = b''.join(int(x).to_bytes(3, 'little', signed=True) for x in frames.ravel())
+    body = (b'WAVE' + chunk(b'fmt ', fmt_body(WAVE_FORMAT_EXTENSIBLE, 2, 8000, 3, WAVE_FORMAT_PCM)) +
+            chunk(b'LIST', b'odd') + chunk(b'data', pcm))
+    infile = tmp_path / 'ext.wav'
+    infile.write_bytes(b'RIFF' + struct.pack('<I', len(body)) + body)
+    with MappedWave(str(infile)) as m:
+        assert (m.getnchannels(), m.getsampwidth(), m.getframerate(), m.getnframes()) == (2, 3, 8000, 3)
+        right = bytes2samples(m.readframes(3), m.getsampwidth(), m.getnchannels(), channel=1)
+    assert right.tolist() == [2 ** 23 - 1, 2 ** 23 - 2, 0]
+
+
+def test_rf64(tmp_path):
+    pcm = np.arange(-5, 5, dtype='<i2').tobytes()
+    ds64 = struct.pack('<QQQI', 0, len(pcm), len(pcm) // 2, 0)
+    body = (b'WAVE' + chunk(b'ds64', ds64) + chunk(b'fmt ', fmt_body(WAVE_FORMAT_PCM, 1, 22050, 2)) +
+            chunk(b'data', pcm, size=0xFFFFFFFF))
+    infile = tmp_path / 'rf64.wav'
+    infile.write_bytes(b'RF64' + struct.pack('<I', 0xFFFFFFFF) + body)
+    with MappedWave(str(infile)) as m:
+        assert m.getnframes() == 10
+        assert bytes2samples(m.readframes(10)).tolist() == list(range(2 ** 15 - 5, 2 ** 15 + 5))
+
+
+def test_bad_files(tmp_path):
+    bad = tmp_path / 'bad.wav'
+    bad.write_bytes(b'')
+    with pytest.raises(wave.Error):
+        MappedWave(str(bad))
+    bad.write_bytes(b'RIFF\x00\x00\x00\x00AVI ')
+    with pytest.raises(wave.Error):
+        MappedWave(str(bad))
+    body = b'WAVE' + chunk(b'fmt ', fmt_body(3, 1, 8000, 4)) + chunk(b'data', b'\x00' * 8)  # IEEE float
+    bad.write_bytes(b'RIFF' + struct.pack('<I', len(body)) + body)
+    with pytest.raises(wave.Error):
+        MappedWave(str(bad))
+    body = b'WAVE' + chunk(b'fmt ', fmt_body(WAVE_FORMAT_PCM, 1, 8000, 2))
+    bad.write_bytes(b'RIFF' + struct.pack('<I', len(body)) + body)
+    with pytest.raises(wave.Error):
+        MappedWave(str(bad))
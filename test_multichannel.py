@@ -0,0 +1,72 @@
+import tracemalloc
+import wave
+
+import numpy as np
+import pytest
+
+from wave_helpers import WaveData, Fourier, Bitstream
+from multichannel import DecodeConfig, decode_configs, multi_pipeline
+from synthetic import random_bits, fsk_samples, samples2bytes, bit_error_rate
+
+
+@pytest.fixture
+def stereo_wav(tmp_path):
+    # Two antennas: different bits, and the right one hears the tones shifted and with more noise.
+    rng = np.random.default_rng(7)
+    left_bits, right_bits = random_bits(400, seed=1), random_bits(400, seed=2)
+    left, _ = fsk_samples(left_bits, noise=0.05, rng=rng)
+    right, _ = fsk_samples(right_bits, mark=1700, space=850, noise=0.2, rng=rng)
+    infile = str(tmp_path / 'stereo.wav')
+    with wave.open(infile, 'w') as fh:
+        fh.setnchannels(2)
+        fh.setsampwidth(2)
+        fh.setframerate(22050)
+        fh.writeframes(samples2bytes(np.column_stack((left, right)).ravel()))
+    return infile, (left_bits, right_bits)
+
+
+CONFIGS = [DecodeConfig(400, 2000, 3), DecodeConfig(500, 1900, 3), (300, 2500, 4), DecodeConfig(400, 2000, 2)]
+
+
+def test_decode_configs(stereo_wav):
+    infile, sent = stereo_wav
+    streams = multi_pipeline(infile, CONFIGS)
+    assert len(streams) == 2 * len(CONFIGS)
+    for config in map(lambda c: DecodeConfig(*c), CONFIGS):
+        for channel in (0, 1):
+            with wave.open(infile, 'r') as fh:
+                w = WaveData(fh, n_symbols_to_read=None, channel=channel)
+            f = Fourier(w, config.seg_per_symbol)
+            f.apply_passband(config.pass_lo, config.pass_hi)
+            assert np.array_equal(streams[channel, config], Bitstream(f).stream)
+        assert bit_error_rate(streams[0, config], sent[0]) == 0
+
+
+def test_decode_configs_one_channel(stereo_wav):
+    infile, _ = stereo_wav
+    with wave.open(infile, 'r') as fh:
+        w = WaveData(fh, n_symbols_to_read=None, channel=1)
+    assert list(decode_configs(w, CONFIGS[:1])) == [(1, CONFIGS[0])]
+
+
+def test_wavedata_all_channels(stereo_wav, capsys):
+    infile, _ = stereo_wav
+    with wave.open(infile, 'r') as fh:
+        w = WaveData(fh, n_symbols_to_read=None, channel=None)
+        w.print_summary()
+    assert w.int_list.shape == (2, 400 * 441 + 10 * 441)
+    assert '[[' in capsys.readouterr().out
+
+
+def test_memory_flat_in_configs(stereo_wav):
+    infile, _ = stereo_wav
+    with wave.open(infile, 'r') as fh:
+        w = WaveData(fh, n_symbols_to_read=None, channel=None)
+    peaks = []
+    for n_configs in (1, 8):
+        configs = [DecodeConfig(400 + 10 * i, 2000 - 10 * i) for i in range(n_configs)]
+        tracemalloc.start()
+        decode_configs(w, configs)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    assert peaks[1] < 1.1 * peaks[0]
@@ -0,0 +1,43 @@
+import pytest
+import numpy as np
+import wave
+
+from wave_helpers import WaveData, Fourier, whole_pipeline
+from streaming import StftPlan, segment_range_indices
+from parallel import split_segments, parallel_bitstream
+
+
+def test_split_segments():
+    assert split_segments(10, 3) == [(0, 3), (3, 7), (7, 10)]
+    assert split_segments(2, 5) == [(0, 1), (1, 2)]
+    pieces = split_segments(302, 7)
+    assert pieces[0][0] == 0 and pieces[-1][1] == 302
+    assert all(a[1] == b[0] for a, b in zip(pieces[:-1], pieces[1:]))
+
+
+def test_segment_range_indices():
+    with wave.open('sample-data.wav', 'r') as fh:
+        w = WaveData(fh, start_sample=300, n_symbols_to_read=40)
+        plan = StftPlan(fh, start_sample=300, n_symbols_to_read=40)
+        f = Fourier(w)
+        f.apply_passband(400, 2000)
+        for first, last in [(0, 1), (0, 5), (3, 50), (100, plan.n_segments - 1), (plan.n_segments - 2, plan.n_segments)]:
+            assert np.array_equal(segment_range_indices(fh, plan, first, last), f.max_freq_indices[first:last])
+        with pytest.raises(ValueError):
+            segment_range_indices(fh, plan, 5, 5)
+        with pytest.raises(ValueError):
+            segment_range_indices(fh, plan, 0, plan.n_segments + 1)
+
+
+@pytest.mark.parametrize('n_workers, piece_samples', [(1, 2 ** 22), (2, 2 ** 22), (3, 1000), (4, 147)])
+def test_parallel_bitstream(n_workers, piece_samples):
+    expected = whole_pipeline(outfile=None)
+    assert np.array_equal(parallel_bitstream(n_workers=n_workers, piece_samples=piece_samples), expected)
+
+
+def test_whole_pipeline_workers():
+    expected = whole_pipeline(outfile=None, start_sample=1234, n_symbols_to_read=25)
+    assert np.array_equal(whole_pipeline(outfile=None, start_sample=1234, n_symbols_to_read=25, n_workers=2,
+                                         backend='mmap'), expected)
+    with pytest.raises(ValueError):
+        whole_pipeline(outfile='plot_default.png', n_workers=2)
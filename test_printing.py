@@ -1,4 +1,6 @@
-from printing import pretty_hex_string, ints2dots
+import numpy as np
+
+from printing import pretty_hex_string, ints2dots, hex_dump, dot_lines
 
 
 def test_pretty_hex_string():
@@ -16,3 +18,18 @@ def test_ints2dots():
     assert len(list(ints2dots([65535]))[0]) == 76
     assert '.' * 10 in list(ints2dots([65535]))[0]
     assert '.' * (75 // 10) in list(ints2dots([65535 // 10]))[0]
+
+
+def test_hex_dump():
+    data = bytes(range(0, 250, 7))
+    for bytes_space, bytes_newline in [(2, 16), (1, 4), (3, 8), (2, 3)]:
+        assert hex_dump(data, bytes_space, bytes_newline) == ''.join(
+            pretty_hex_string(data.hex(), bytes_space, bytes_newline))
+    assert hex_dump(b'\xab\xcd\xef\x01\x23') == 'abcd ef01 23'
+    assert hex_dump(memoryview(b'')) == ''
+
+
+def test_dot_lines():
+    ints = [-5, 0, 3, 1000, 2000, 4000, 65535, 32767]
+    assert dot_lines(ints) == list(ints2dots(ints))
+    assert dot_lines(np.array([255]), max_int=255, max_spaces=3) == ['...X']
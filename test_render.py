@@ -0,0 +1,55 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+from render import max_pool, render_spectrogram, write_image, TileRenderer
+
+
+def test_max_pool():
+    magnitude = np.random.default_rng(0).random((50, 1003))
+    f, t = np.arange(50) * 10.0, np.arange(1003) / 150
+    pooled, pooled_f, pooled_t = max_pool(magnitude, f, t, 20, 100)
+    assert pooled.shape == (20, 100) and pooled_f.shape == (20,) and pooled_t.shape == (100,)
+    assert pooled.max() == magnitude.max() and pooled[0, 0] == magnitude[:2, :10].max()
+    assert pooled_f[0] == 5.0 and np.all(np.diff(pooled_t) > 0)
+    same, _, _ = max_pool(magnitude, f, t, 100, 2000)  # already smaller than the pixels
+    assert np.array_equal(same, magnitude)
+
+
+def test_render_spectrogram(tmp_path):
+    filename = str(tmp_path / 'x.png')
+    f, t = np.linspace(400, 2000, 40), np.arange(200000) / 150  # 22 minutes at 50 baud
+    render_spectrogram(filename, f, t, np.random.default_rng(0).random((40, 200000)).astype(np.float32))
+    with open(filename, 'rb') as fh:
+        assert fh.read(8) == b'\x89PNG\r\n\x1a\n'
+    if 'matplotlib.pyplot' in sys.modules:
+        assert sys.modules['matplotlib.pyplot'].get_fignums() == []  # nothing left open
+
+
+def test_write_image(tmp_path):
+    filename = str(tmp_path / 'x.pgm')
+    magnitude = np.zeros((4, 6), dtype=np.uint8)
+    magnitude[0, 5] = 200  # lowest frequency, last time point
+    assert write_image(filename, magnitude) == (4, 6)
+    with open(filename, 'rb') as fh:
+        assert fh.read(11) == b'P5\n6 4\n255\n'
+        pixels = np.frombuffer(fh.read(), dtype=np.uint8).reshape(4, 6)
+    assert pixels[3, 5] == 255 and pixels.sum() == 255
+    assert write_image(filename, magnitude, 2, 3) == (2, 3)
+
+
+def test_tile_renderer(tmp_path):
+    t = np.arange(15000) / 150  # 100 s
+    tiles = TileRenderer(np.arange(8), t, np.random.default_rng(0).random((8, 15000)), tmp_path / 'tiles',
+                         tile_seconds=30, height=8, width=64)
+    assert tiles.n_tiles() == 4
+    name = tiles.tile(1)
+    assert os.path.basename(name) == '30s-1.pgm' and os.path.exists(name)
+    assert tiles.tile(1) == name and tiles.n_rendered == 1  # kept, not rendered again
+    tiles.tile(3)
+    tiles.tile(0, tile_seconds=100)
+    assert tiles.n_rendered == 3
+    with pytest.raises(ValueError):
+        tiles.tile(4)
@@ -0,0 +1,70 @@
+import pytest
+import numpy as np
+import tracemalloc
+import wave
+
+from wave_helpers import WaveData, Fourier, Bitstream, whole_pipeline
+from streaming import StftPlan, stream_max_freq_indices, stream_bitstream, stream_pipeline
+from synthetic import random_bits, write_fsk_wav
+
+
+def test_stft_plan():
+    with wave.open('sample-data.wav', 'r') as fh:
+        w = WaveData(fh, n_symbols_to_read=None)
+        p = StftPlan(fh)
+    f = Fourier(w)
+    f.apply_passband(400, 2000)
+    b = Bitstream(f)
+    assert p.n_segments == f.Zxx.shape[1]
+    assert p.seg_per_symbol == b.calculated_seg_per_symbol
+
+
+@pytest.mark.parametrize('block_size', [1, 100, 147, 1000, 2 ** 16])
+def test_stream_max_freq_indices(block_size):
+    with wave.open('sample-data.wav', 'r') as fh:
+        w = WaveData(fh, n_symbols_to_read=None)
+        streamed = np.concatenate(list(stream_max_freq_indices(fh, StftPlan(fh), block_size=block_size)))
+    f = Fourier(w)
+    f.apply_passband(400, 2000)
+    assert np.array_equal(streamed, f.max_freq_indices)
+
+
+@pytest.mark.parametrize('start_sample, n_symbols_to_read, block_size', [
+    (0, None, 500), (0, None, 4096), (1000, None, 333), (0, 20, 1000), (2000, 30, 777)])
+def test_stream_pipeline(start_sample, n_symbols_to_read, block_size):
+    expected = whole_pipeline(outfile=None, start_sample=start_sample, n_symbols_to_read=n_symbols_to_read)
+    streamed = np.concatenate(list(stream_pipeline(start_sample=start_sample, n_symbols_to_read=n_symbols_to_read,
+                                                   block_size=block_size)))
+    assert np.array_equal(streamed, expected)
+
+
+def test_stream_bitstream_known_tones():
+    expected = whole_pipeline(outfile=None)
+    with wave.open('sample-data.wav', 'r') as fh:
+        streamed = np.concatenate(list(stream_bitstream(fh, mark_space=(7, 1), block_size=1000)))
+        with pytest.raises(ValueError):
+            list(stream_bitstream(fh, mark_space=(2, 1)))
+    assert np.array_equal(streamed, expected)
+
+
+def test_stream_long_file(tmp_path):
+    # 40 minutes of audio. The in-memory path needs about 50 bytes per sample here, i.e. over 2.5 GB.
+    bits = random_bits(120000, seed=4481)
+    infile = tmp_path / 'long.wav'
+    write_fsk_wav(infile, bits)
+
+    # A prefix is still small enough to check against the in-memory path directly.
+    expected_prefix = whole_pipeline(infile=str(infile), outfile=None, n_symbols_to_read=3000)
+    streamed_prefix = np.concatenate(list(stream_pipeline(str(infile), n_symbols_to_read=3000, block_size=10000)))
+    assert np.array_equal(streamed_prefix, expected_prefix)
+
+    tracemalloc.start()
+    n_bits = 0
+    errors = 0
+    for block in stream_pipeline(str(infile)):
+        errors += np.count_nonzero(block != bits[n_bits:n_bits + len(block)])
+        n_bits += len(block)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert n_bits == len(bits) and errors == 0
+    assert peak < 32 * 2 ** 20
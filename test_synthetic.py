@@ -0,0 +1,54 @@
+import pytest
+import numpy as np
+import wave
+
+from wave_helpers import bytes2samples, whole_pipeline
+from synthetic import random_bits, samples2bytes, fsk_samples, make_fsk_wav, bit_error_rate
+from bench_stages import run_benchmarks
+
+
+def test_samples2bytes():
+    for width in (1, 2, 3, 4):
+        top = 2 ** (8 * width) - 1
+        samples = np.array([0, 1, top // 2, top // 2 + 1, top - 1, top], dtype=np.uint32)
+        assert np.array_equal(bytes2samples(samples2bytes(samples, width), width), samples)
+    with pytest.raises(ValueError):
+        samples2bytes([0], 5)
+
+
+def test_fsk_samples():
+    bits = random_bits(20, seed=1)
+    assert len(bits) == 30 and np.all(bits[:5] == 1) and np.all(bits[-5:] == 1)
+    whole, _ = fsk_samples(bits)
+    first, phase = fsk_samples(bits[:7])
+    rest, _ = fsk_samples(bits[7:], first_sample=len(first), phase=phase)
+    assert len(whole) == 30 * 441
+    assert np.array_equal(np.concatenate((first, rest)), whole)  # chunks join seamlessly
+    assert whole.max() <= 2 ** 15 + 2 ** 14 and whole.min() >= 2 ** 15 - 2 ** 14
+
+
+@pytest.mark.parametrize('sample_width', [1, 2, 3, 4])
+def test_decode_synthetic(tmp_path, sample_width):
+    infile = str(tmp_path / 'fsk.wav')
+    bits = make_fsk_wav(infile, 20, seed=sample_width, sample_width=sample_width, noise=0.2)
+    with wave.open(infile, 'r') as fh:
+        assert fh.getsampwidth() == sample_width and fh.getnframes() == 20 * 22050
+    assert bit_error_rate(whole_pipeline(infile, outfile=None), bits) == 0
+
+
+def test_bit_error_rate():
+    assert bit_error_rate(np.array([1, 0, 1, 1]), np.array([1, 0, 1, 1])) == 0
+    assert bit_error_rate(np.array([1, 1, 1, 1]), np.array([1, 0, 1, 1])) == 0.25
+    assert bit_error_rate(np.array([1, 0]), np.array([1, 0, 1, 1])) == 0.5
+
+
+def test_bench_stages():
+    records = run_benchmarks([1], repeats=1)
+    stages = [r['stage'] for r in records]
+    assert stages == ['bytes2samples', 'WaveData', 'Fourier', 'apply_passband', 'Bitstream', 'SoftBitstream', 'rle',
+                      'run_length_to_bitstream', 'bit_error_rate', 'soft_bit_error_rate']
+    assert all(r['seconds'] >= 0 and r['peak_bytes'] >= 0 for r in records[:-2])
+    assert records[-2]['bit_error_rate'] == 0 and records[-1]['bit_error_rate'] == 0
+
+    records = run_benchmarks([1], repeats=1, sample_width=3)
+    assert records[0]['n_out'] == records[1]['n_out'] == 22050  # bytes2samples gets the width, not 2 bytes
@@ -0,0 +1,64 @@
+import wave
+
+import numpy as np
+import pytest
+
+from wave_helpers import whole_pipeline, estimate_baud
+from timing import estimate_symbol_timing, estimate_timing
+from synthetic import make_fsk_wav, bit_error_rate
+
+
+@pytest.mark.parametrize('baud, noise', [(45.45, 0.0), (50, 0.3), (75, 0.1), (100, 0.3), (150, 0.0)])
+def test_estimate_symbol_timing(tmp_path, baud, noise):
+    infile = str(tmp_path / 'x.wav')
+    make_fsk_wav(infile, 20, seed=1, baud=baud, noise=noise)
+    with wave.open(infile, 'r') as fh:
+        timing = estimate_symbol_timing(fh, start_sample=1000)
+    period = 22050 / baud
+    assert timing.baud == baud
+    assert abs((timing.phase - (-1000) % period + period / 2) % period - period / 2) < period * 0.05
+    assert timing.score > 0.7
+
+
+def test_phase_aligns_decode(tmp_path):
+    # Start reading 173 samples before the boundary of symbol 10, so the first boundary is 173 samples in.
+    infile = str(tmp_path / 'x.wav')
+    bits = make_fsk_wav(infile, 20, seed=5, noise=0.2)
+    with wave.open(infile, 'r') as fh:
+        timing = estimate_symbol_timing(fh, start_sample=10 * 441 - 173)
+    assert abs(timing.phase - 173) < 441 * 0.05
+    decoded = whole_pipeline(infile, outfile=None, start_sample=10 * 441 - 173 + int(round(timing.phase)),
+                             baud=timing.baud)
+    assert bit_error_rate(decoded, bits[10:]) == 0
+
+
+def test_estimate_unlisted_baud(tmp_path):
+    infile = str(tmp_path / 'x.wav')
+    make_fsk_wav(infile, 20, seed=2, baud=62.3, noise=0.1)
+    with wave.open(infile, 'r') as fh:
+        assert abs(estimate_symbol_timing(fh).baud - 62.3) < 0.1
+        assert estimate_symbol_timing(fh, standard_bauds=(50, 75)).baud != 50
+
+
+def test_estimate_timing_harmonics():
+    # Runs of 1 to 5 symbols of 441 samples. 220.5 fits them all too, but the slower rate is the answer.
+    runs = np.random.default_rng(3).integers(1, 6, 100)
+    transitions = 100 + 441 * np.cumsum(runs)
+    timing = estimate_timing(transitions, 22050, standard_bauds=())
+    assert abs(timing.baud - 50) < 0.01
+    assert abs(timing.phase - 100) < 0.5 and timing.score > 0.999
+    with pytest.raises(ValueError):
+        estimate_timing(transitions[:5], 22050)
+
+
+def test_estimate_timing_long_span():
+    # An hour of transitions makes a fine grid of thousands of periods, computed a few at a time.
+    runs = np.random.default_rng(4).integers(1, 6, 60000)
+    transitions = 441.3 * np.cumsum(runs)
+    timing = estimate_timing(transitions, 22050, standard_bauds=())
+    assert abs(timing.baud - 22050 / 441.3) < 1e-4 and timing.score > 0.999
+
+
+def test_whole_pipeline_auto_baud():
+    assert estimate_baud('sample-data.wav') == 50
+    assert np.array_equal(whole_pipeline(outfile=None, baud=None), whole_pipeline(outfile=None))
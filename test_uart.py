@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from uart import parse_framing, score_offsets, detect_framing, decode_frames, encode_frames, ita2_to_text
+from uart import ascii_to_text, UartDecoder, ITA2_LETTERS, ITA2_FIGURES, ITA2_FIGS, ITA2_LTRS
+
+
+def test_parse_framing():
+    assert parse_framing('7E1') == ('7E1', 7, 'E', 1)
+    for bad in ('8X1', '9N1', '8N3', '8N'):
+        with pytest.raises(ValueError):
+            parse_framing(bad)
+
+
+def test_ita2_to_text():
+    letters = [int(np.flatnonzero(ITA2_LETTERS == c)[0]) for c in 'RYRY']
+    figures = [int(np.flatnonzero(ITA2_FIGURES == c)[0]) for c in '4481']
+    codes = [ITA2_LTRS] + letters + [ITA2_FIGS] + figures + [ITA2_LTRS] + letters[:1]
+    assert ita2_to_text(codes) == ('RYRY4481R', False)
+    assert ita2_to_text(figures[:2], figures=True) == ('44', True)
+    assert ita2_to_text([ITA2_FIGS]) == ('', True)
+    assert ita2_to_text([]) == ('', False)
+
+
+@pytest.mark.parametrize('name', ['5N1', '7E1', '7O1', '8N1', '5N2'])
+def test_decode_round_trip(name):
+    framing = parse_framing(name)
+    rng = np.random.default_rng(1)
+    codes = rng.integers(0, 2 ** framing.data_bits, 500)
+    gaps = rng.integers(0, 4, 500) * (rng.random(500) < 0.3)
+    bits = np.concatenate(([1, 1, 1], encode_frames(codes, framing, gaps), [1, 1]))
+    frames = decode_frames(bits, framing, first=int(np.flatnonzero(bits == 0)[0]))
+    assert np.array_equal(frames.codes, codes)
+    assert not frames.framing_errors.any() and not frames.parity_errors.any()
+
+
+@pytest.mark.parametrize('name', ['5N1', '7E1', '8N1'])
+def test_detect_framing(name):
+    framing = parse_framing(name)
+    codes = np.random.default_rng(2).integers(0, 2 ** framing.data_bits, 300)
+    bits = encode_frames(codes, framing)[4:]  # start mid-frame
+    found, _, score = detect_framing(bits)
+    assert found == framing
+    assert score == 1.0
+    assert np.array_equal(decode_frames(bits, framing).codes, codes[1:])
+
+
+def test_score_offsets():
+    framing = parse_framing('8N1')
+    bits = encode_frames(np.arange(1, 200), framing, np.arange(199) % 3)
+    scores = score_offsets(np.concatenate(([0, 1, 1, 1], bits)), framing)
+    assert scores.argmax() == 1 and scores[1] == 1.0
+    assert scores[0] < 1.0
+
+
+def test_errors():
+    framing = parse_framing('7E1')
+    bits = encode_frames(np.frombuffer(b'NATO STANAG', dtype=np.uint8), framing)
+    bits[9] = 0  # stop bit of first frame
+    bits[10 + 3] ^= 1  # data bit of second frame
+    frames = decode_frames(bits, framing, first=0)
+    assert frames.framing_errors.tolist() == [True] + [False] * 10
+    assert frames.parity_errors.tolist() == [False, True] + [False] * 9
+    assert ascii_to_text(frames.codes)[2:] == 'TO STANAG'
+
+
+@pytest.mark.parametrize('chunk', [1, 7, 100, 4096])
+def test_uart_decoder_chunks(chunk):
+    framing = parse_framing('5N1')
+    rng = np.random.default_rng(3)
+    codes = rng.integers(0, 32, 2000)
+    bits = encode_frames(codes, framing, rng.integers(0, 3, 2000))
+    bits[rng.integers(0, len(bits), 20)] ^= 1  # some bit errors
+    bits = bits[5:]
+
+    expected = decode_frames(bits, framing)
+    expected_text, _ = ita2_to_text(expected.codes)
+    u = UartDecoder('5N1')
+    results = [u.feed(bits[i:i + chunk]) for i in range(0, len(bits), chunk)] + [u.flush()]
+    assert np.array_equal(np.concatenate([f.starts for f, _ in results]), expected.starts)
+    assert np.array_equal(np.concatenate([f.codes for f, _ in results]), expected.codes)
+    assert ''.join(t for _, t in results) == expected_text
+    assert u.n_frames == len(expected.codes)
+    assert u.n_framing_errors == np.count_nonzero(expected.framing_errors) > 0
+
+
+def test_long_stream():
+    # About 5.5 hours of 50 baud
+    framing = parse_framing('8N1')
+    codes = np.random.default_rng(4).integers(0, 256, 100000)
+    bits = encode_frames(codes, framing, np.ones(len(codes), dtype=int))
+    frames = decode_frames(bits, framing)
+    assert np.array_equal(frames.codes, codes)
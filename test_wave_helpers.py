@@ -1,10 +1,15 @@
 # py.test --cov=. --cov-report html
 import pytest  # only need for with pytest.raises(WhateverError):
 import numpy as np
+import io
+import subprocess
+import sys
+import tracemalloc
 import wave
 
-from wave_helpers import bytes2int_list, run_length_to_bitstream, square_up, rle
-from wave_helpers import WaveData, Fourier, Bitstream, whole_pipeline
+from wave_helpers import bytes2int_list, bytes2samples, run_length_to_bitstream, square_up, rle
+from wave_helpers import WaveData, Fourier, Goertzel, Bitstream, SoftBitstream, whole_pipeline, run_stages
+from synthetic import make_fsk_wav, write_fsk_wav, random_bits, fsk_samples, samples2bytes, bit_error_rate
 
 
 def test_bytes2int_list():
@@ -25,6 +30,45 @@ def test_bytes2int_list():
     print("\n    Did %i auto tests of bytes2int_list()" % tests_complete, end='')
 
 
+def test_bytes2samples():
+    # Same values as the old one-byte-at-a-time loop, on every possible 2-byte input.
+    all_pairs = bytes(np.arange(2 ** 16, dtype='<u2').tobytes())
+    expected = [(256 * all_pairs[n + 1] + all_pairs[n] + 2 ** 15) % 2 ** 16 for n in range(0, len(all_pairs), 2)]
+    assert bytes2samples(all_pairs).tolist() == expected
+    assert list(bytes2int_list(b'\x00\x80\xff\x7f\x01')) == [0, 65535]  # trailing odd byte ignored
+
+    # Other sample widths, always offset so that silence is the midpoint.
+    assert bytes2samples(b'\x00\x80\xff', sample_width=1).tolist() == [0, 128, 255]
+    assert bytes2samples(b'\x00\x00\x80\x00\x00\x00\xff\xff\x7f', sample_width=3).tolist() == [0, 2 ** 23, 2 ** 24 - 1]
+    assert bytes2samples(b'\x00\x00\x00\x80\xff\xff\xff\x7f', sample_width=4).tolist() == [0, 2 ** 32 - 1]
+    with pytest.raises(ValueError):
+        bytes2samples(b'\x00' * 8, sample_width=5)
+
+    # Channel selection on interleaved stereo
+    stereo = np.array([[10, -10], [20, -20], [30, -30]], dtype='<i2').tobytes()
+    left = bytes2samples(stereo, 2, n_channels=2, channel=0)
+    right = bytes2samples(stereo, 2, n_channels=2, channel=1)
+    assert left.tolist() == [2 ** 15 + 10, 2 ** 15 + 20, 2 ** 15 + 30]
+    assert right.tolist() == [2 ** 15 - 10, 2 ** 15 - 20, 2 ** 15 - 30]
+    assert left.flags['C_CONTIGUOUS']
+    both = bytes2samples(stereo, 2, n_channels=2, channel=None)
+    assert both.shape == (2, 3) and np.all(both[1] == right)
+    with pytest.raises(ValueError):
+        bytes2samples(stereo, 2, n_channels=2, channel=2)
+
+    # 8-bit mono needs no offset, so no copy is made.
+    buf = b'\x01\x02\x03'
+    assert np.shares_memory(bytes2samples(buf, sample_width=1), np.frombuffer(buf, dtype=np.uint8))
+
+
+def test_wavedata_samples():
+    with wave.open('sample-data.wav', 'r') as fh:
+        w = WaveData(fh, n_symbols_to_read=None)
+    assert isinstance(w.int_list, np.ndarray)
+    assert len(w.int_list) == w.n_samples_actually_read == 22227
+    assert w.int_list.tolist()[:4] == [32547, 32606, 32964, 33108]
+
+
 def test_rl2b():
     with pytest.raises(ValueError):
         dummy = run_length_to_bitstream(np.array([5, 5, 1]), np.array([7, 1]), 7, 1)  # throwaway
@@ -67,8 +111,140 @@ def test_bitstream_exception():
         dummy = Bitstream(f)  # throwaway
 
 
+def test_goertzel():
+    with wave.open('sample-data.wav', 'r') as fh:
+        w = WaveData(fh, n_symbols_to_read=None)
+    f = Fourier(w)
+    g = Goertzel(w)
+    assert np.all(g.f == [600, 1500])
+    assert g.Zxx.shape == (2, f.Zxx.shape[1]) and np.allclose(g.t, f.t)
+
+    # Same magnitudes as the STFT at the tone bins, except where the STFT sees the zero-padded DC offset at the ends.
+    stft_tones = np.abs(f.Zxx[g.tone_bins])
+    assert np.allclose(g.Zxx[:, 1:-2], stft_tones[:, 1:-2], rtol=1e-4, atol=1e-2)
+
+    g.apply_passband(400, 2000)
+    f.apply_passband(400, 2000)
+    assert set(g.max_freq_indices) == {1, 7}
+    assert np.mean(g.max_freq_indices == square_up(f.max_freq_indices, 7, 1)) > 0.95
+    bits_stft = Bitstream(f).stream
+    bits_goertzel = Bitstream(g).stream
+    assert np.all(bits_goertzel[:45] == bits_stft[:45])  # they differ only in a noisy stretch near the end
+    assert (len(bits_stft), len(bits_goertzel)) == (49, 51)  # as in Goertzel's docstring
+
+    g2 = Goertzel(w, tones=(1500, 600))
+    assert np.array_equal(g2.Zxx, Goertzel(w).Zxx)
+    with pytest.raises(ValueError):
+        g2.apply_passband(700, 2000)
+
+    assert np.array_equal(whole_pipeline(outfile=None, detector='goertzel'), bits_goertzel)
+    with pytest.raises(ValueError):
+        whole_pipeline(outfile=None, detector='nope')
+
+
+@pytest.mark.parametrize('duration', [1, 20])
+def test_goertzel_matches_stft(tmp_path, duration):
+    # Mark or space is always the loudest bin in a steady synthetic signal, so both detectors give the same bits.
+    infile = str(tmp_path / 'x.wav')
+    bits = make_fsk_wav(infile, duration, seed=3, noise=0.3)
+    assert np.array_equal(whole_pipeline(infile, outfile=None, detector='goertzel'), whole_pipeline(infile, outfile=None))
+    assert bit_error_rate(whole_pipeline(infile, outfile=None, detector='goertzel'), bits) == 0
+
+
 def test_whole_pipeline():
     whole_pipeline(infile='sample-data.wav', outfile='plot_default.png', n_symbols_to_read=100)
+    whole_pipeline(infile='sample-data.wav', outfile='plot_default.png', n_symbols_to_read=100, detector='goertzel')
     # throwaway return value
     # Quit at 100 symbols = 2 sec, so effectively read the whole of sample-data.wav, which is only 1 sec.
     # fixme - very basic, no asserts at all, just needs to run without error.
+
+
+IMPORT_TIME_BUDGET = 1.0  # seconds. NumPy alone is about 0.1 s; SciPy + matplotlib would add well over 1 s.
+
+
+def test_import_time():
+    # Fresh interpreter, so that nothing is already imported by other tests.
+    code = ("import sys, time\n"
+            "t0 = time.perf_counter()\n"
+            "import wave_helpers\n"
+            "print(time.perf_counter() - t0)\n"
+            "print(' '.join(m for m in ('matplotlib', 'scipy') if m in sys.modules))\n")
+    out = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, universal_newlines=True,
+                         check=True).stdout.split('\n')
+    assert out[1] == '', "heavy modules imported by wave_helpers: " + out[1]
+    assert float(out[0]) < IMPORT_TIME_BUDGET
+
+
+def test_report_to_file(tmp_path, capsys):
+    whole_pipeline(outfile=str(tmp_path / 'x.png'))
+    printed = capsys.readouterr().out
+    report = io.StringIO()
+    whole_pipeline(outfile=str(tmp_path / 'x.png'), report=report)
+    assert capsys.readouterr().out == ''
+    assert report.getvalue() == printed
+
+
+def test_print_summary_cost_independent_of_length(tmp_path):
+    infile = str(tmp_path / 'long.wav')
+    make_fsk_wav(infile, 600, seed=0)  # 10 minutes, 26 MB of samples
+    with wave.open(infile, 'r') as fh:
+        w = WaveData(fh, n_symbols_to_read=None)
+    tracemalloc.start()
+    w.print_summary(file=io.StringIO())
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert peak < 100000  # only the displayed samples are formatted
+
+
+def test_soft_bitstream():
+    w, f, b = run_stages()
+    s = SoftBitstream(f)
+    assert set(s.stream) <= {0, 1} and len(s.llr) == len(s.confidence) == len(s.stream)
+    assert np.all((s.confidence >= 0) & (s.confidence <= 1))
+    assert np.array_equal(s.stream, s.llr > 0)
+    assert (s.high, s.low) == (b.high, b.low)
+    assert np.array_equal(s.stream[:45], b.stream[:45])  # they differ only in a noisy stretch near the end
+    assert np.array_equal(whole_pipeline(outfile=None, decision='soft'), s.stream)
+    g = Goertzel(w)
+    g.apply_passband(400, 2000)
+    assert np.array_equal(SoftBitstream(g).stream[:45], s.stream[:45])
+    with pytest.raises(ValueError):
+        whole_pipeline(outfile=None, decision='nope')
+    with pytest.raises(ValueError):
+        whole_pipeline(outfile=None, decision='soft', n_workers=2)
+
+
+def test_soft_bitstream_noise(tmp_path):
+    infile = str(tmp_path / 'noisy.wav')
+    bits = make_fsk_wav(infile, 30, seed=3, noise=1.2)
+    w, f, b = run_stages(infile)
+    s = SoftBitstream(f)
+    assert len(s.stream) == len(bits) and bit_error_rate(s.stream, bits) < 0.01
+    assert bit_error_rate(b.stream, bits) > 0.1
+    assert np.mean(s.confidence[s.stream != bits]) < np.mean(s.confidence)  # errors are the unsure bits
+
+
+def test_soft_bitstream_drift(tmp_path):
+    bits = random_bits(1500, seed=5)
+    infile = str(tmp_path / 'clock.wav')
+    write_fsk_wav(infile, bits, baud=50.2, noise=0.3, seed=1)  # decoded as 50 baud
+    w, f, b = run_stages(infile, baud=50)
+    assert bit_error_rate(SoftBitstream(f).stream, bits) == 0
+
+    # Both tones move up one 150 Hz bin every 500 bits.
+    infile = str(tmp_path / 'tones.wav')
+    rng = np.random.default_rng(2)
+    phase = 0.0
+    with wave.open(infile, 'w') as fh:
+        fh.setnchannels(1)
+        fh.setsampwidth(2)
+        fh.setframerate(22050)
+        for i, shift in enumerate([0, 150, 300]):
+            chunk = bits[i * 500:(i + 1) * 500] if i < 2 else bits[1000:]
+            samples, phase = fsk_samples(chunk, i * 500 * 441, phase, mark=1500 + shift, space=600 + shift,
+                                         noise=0.6, rng=rng)
+            fh.writeframes(samples2bytes(samples))
+    with wave.open(infile, 'r') as fh:
+        f = Fourier(WaveData(fh, n_symbols_to_read=None))
+    f.apply_passband(400, 2000)
+    assert bit_error_rate(SoftBitstream(f, window_symbols=100).stream, bits) == 0  # Bitstream has 4 tones to choose from
@@ -0,0 +1,138 @@
+import collections
+import wave  # so we can refer to its classes in type hint annotations
+
+import numpy as np
+
+from wave_helpers import bytes2samples, square_up, infer_mark_space
+
+SymbolTiming = collections.namedtuple('SymbolTiming', 'baud phase score')
+
+# Common rates: 45.45 and 50 baud RTTY and STANAG-4481, then the usual serial rates.
+STANDARD_BAUDS = (45.45, 50, 56.88, 75, 100, 110, 150, 200, 300, 600, 1200)
+
+
+def tone_decisions(samples: np.ndarray, sample_rate: int, pass_lo: float = 400, pass_hi: float = 2000,
+                   resolution_hz: float = 100) -> tuple:
+    """Decide mark or space at fine time steps, without knowing the baud. Uses an STFT with windows just long
+    enough to tell the tones apart, and a quarter-window hop.
+
+    :param samples: Array of samples
+    :param sample_rate: Samples per second
+    :param pass_lo: Spectrum below this frequency (Hz) is ignored as neither mark nor space.
+    :param pass_hi: Spectrum above this frequency (Hz) is ignored as neither mark nor space.
+    :param resolution_hz: Width of a frequency bin. Must be well under the mark/space shift.
+    :return: Tuple of (array of 1 for mark and 0 for space, sample position of each decision).
+    :raises: ValueError if there are not two distinct tones
+    """
+    from scipy import signal  # only when timing is actually estimated
+    nperseg = int(sample_rate / resolution_hz)
+    hop = max(nperseg // 4, 1)
+    f, _, zxx = signal.stft(np.asarray(samples, dtype=np.float64), fs=sample_rate, nperseg=nperseg,
+                            noverlap=nperseg - hop, boundary=None, padded=False)
+    selected_indices = ((pass_lo < f) * (f < pass_hi))
+    idx = np.abs(zxx[selected_indices]).argmax(0)
+    high, low = infer_mark_space(np.bincount(idx, minlength=2))
+    squared = square_up(idx, high, low)
+    decisions = (np.abs(squared - high) < np.abs(squared - low)).astype(int)  # anything else goes to the nearer
+    positions = np.arange(len(idx)) * hop + nperseg / 2  # window centres
+    return decisions, positions
+
+
+def _coherence(t: np.ndarray, periods: np.ndarray) -> np.ndarray:
+    """How well transitions t agree on one symbol phase, for each period: the magnitude of their mean phasor. A few
+    periods at a time, so the grid of periods * transitions stays small.
+    """
+    rows = max(2 ** 16 // len(t), 1)
+    return np.concatenate([np.abs(np.exp(2j * np.pi * (t - t[0])[np.newaxis, :] / periods[i:i + rows, np.newaxis])
+                                  .mean(axis=1)) for i in range(0, len(periods), rows)])
+
+
+def _refine_period(t: np.ndarray, period: float, width: float) -> float:
+    """Find the most coherent period within a relative `width` of period, see estimate_timing()."""
+    n_fine = 1 + 2 * int(np.ceil(20 * width * (t[-1] - t[0]) / period))
+    fine = np.linspace(-width, width, n_fine)
+    c = _coherence(t, period * np.exp(fine))
+    i = int(np.clip(c.argmax(), 1, n_fine - 2))
+    curvature = c[i - 1] - 2 * c[i] + c[i + 1]
+    offset = 0.5 * (c[i - 1] - c[i + 1]) / curvature if curvature < 0 else 0.0  # vertex of a parabola through 3
+    return period * np.exp(fine[i] + offset * (fine[1] - fine[0]))
+
+
+def estimate_timing(transitions: np.ndarray, sample_rate: int, min_baud: float = 40, max_baud: float = 200,
+                    standard_bauds: tuple = STANDARD_BAUDS, tolerance: float = 0.015) -> SymbolTiming:
+    """Find the symbol period that mark/space transitions line up with.
+
+    First, the times between transitions (the run lengths) should each be a whole number of periods, so every
+    candidate period on a coarse grid is scored by the mean cosine of 2 pi * interval / period, all at once. Whole
+    fractions of the period score just as well, so the longest period that scores close to the best is taken. Then
+    the period is refined from how well all transitions agree on one symbol phase (the magnitude of their mean
+    phasor), which needs the period accurate over the whole span. The longer the span, the narrower that peak, so
+    the period is refined over ten times the span each time, within the width of the last peak. The angle of the
+    mean phasor at the final period is the symbol phase.
+
+    :param transitions: Sample positions of mark/space transitions
+    :param sample_rate: Samples per second
+    :param min_baud: Slowest rate to consider
+    :param max_baud: Fastest rate to consider
+    :param standard_bauds: Rates to snap to when the estimate is within `tolerance` of one. `()` for no snapping.
+    :param tolerance: Relative difference for snapping
+    :return: SymbolTiming of baud, phase (sample position of the first symbol boundary, 0 to one symbol) and score
+        (0 to 1, 1 if every transition falls exactly on a symbol boundary).
+    :raises: ValueError if there are too few transitions
+    """
+    t = np.asarray(transitions, dtype=np.float64)
+    if len(t) < 8:
+        raise ValueError("Only %i mark/space transitions, too few to estimate baud" % len(t))
+    intervals = np.diff(t)
+    step = 0.005  # relative, fine enough for runs of up to about 10 symbols
+    periods = sample_rate / max_baud * np.exp(np.arange(0, np.log(max_baud / min_baud) + step, step))
+    s = np.cos(2 * np.pi * intervals[np.newaxis, :] / periods[:, np.newaxis]).mean(axis=1)
+    peaks = np.flatnonzero((s >= 0.7 * s.max()) & (s >= np.roll(s, 1)) & (s >= np.roll(s, -1)))
+    period = periods[peaks[-1]]  # longest period, i.e. slowest rate, among the strong peaks
+
+    width = step
+    while True:  # over ever longer spans, so at most 401 periods are tried at a time
+        n_used = max(int(np.searchsorted(t, t[0] + 10 * period / width, 'right')), 8)
+        period = _refine_period(t[:n_used], period, width)
+        if n_used == len(t):
+            break
+        width = period / (t[n_used - 1] - t[0])  # how wide the peak in coherence was, over that span
+    baud = sample_rate / period
+    if len(standard_bauds):
+        nearest = min(standard_bauds, key=lambda b: abs(b - baud))
+        if abs(nearest - baud) <= tolerance * nearest:
+            baud = nearest
+            period = sample_rate / baud
+    phasor = np.exp(2j * np.pi * t / period).mean()
+    return SymbolTiming(float(baud), float(np.angle(phasor) / (2 * np.pi) * period % period), float(np.abs(phasor)))
+
+
+def estimate_symbol_timing(wav_file: wave.Wave_read, start_sample: int = 0, prefix_seconds: float = 4.0,
+                           pass_lo: float = 400, pass_hi: float = 2000, channel: int = 0, resolution_hz: float = 100,
+                           **kwargs) -> SymbolTiming:
+    """Estimate baud and symbol phase from a short prefix of a recording, in one pass, so that the baud need not be
+    given to WaveData, Fourier and Bitstream.
+
+    Example:
+    estimate_symbol_timing(fh) -> SymbolTiming(baud=50, phase=12.3, score=0.97)
+
+    :param wav_file: Object opened by wave.open()
+    :param start_sample: Where in the file to start reading
+    :param prefix_seconds: How much of the recording to use
+    :param pass_lo: Spectrum below this frequency (Hz) is ignored as neither mark nor space.
+    :param pass_hi: Spectrum above this frequency (Hz) is ignored as neither mark nor space.
+    :param channel: Which channel of a multi-channel file to use
+    :param resolution_hz: See tone_decisions(). The STFT window is 1 / resolution_hz long, so for rates over about
+        150 baud, raise it (and max_baud) as far as the mark/space shift allows.
+    :param kwargs: Passed to estimate_timing(), e.g. min_baud, max_baud, standard_bauds
+    :return: SymbolTiming. Phase is counted from start_sample.
+    :raises: ValueError if the prefix has no clear mark and space, or too few transitions
+    """
+    wav_file.setpos(start_sample)
+    sample_rate = wav_file.getframerate()
+    wav_bytes = wav_file.readframes(int(prefix_seconds * sample_rate))
+    samples = bytes2samples(wav_bytes, wav_file.getsampwidth(), wav_file.getnchannels(), channel)
+    decisions, positions = tone_decisions(samples, sample_rate, pass_lo, pass_hi, resolution_hz)
+    changes = np.flatnonzero(decisions[1:] != decisions[:-1])
+    transitions = (positions[changes] + positions[changes + 1]) / 2
+    return estimate_timing(transitions, sample_rate, **kwargs)
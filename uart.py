@@ -0,0 +1,278 @@
+import collections
+
+import numpy as np
+
+Framing = collections.namedtuple('Framing', 'name data_bits parity stop_bits')
+Frames = collections.namedtuple('Frames', 'starts codes framing_errors parity_errors')
+
+# ITA2 ("Baudot") by code value, first data bit on the line = least significant bit. '\0' is blank, '\x05' is
+# WRU, and the national-use figures F, G, H are given their common US values.
+ITA2_LETTERS = np.array(list('\0E\nA SIU\rDRJNFCKTZLWHYPQOBG\0MXV\0'))
+ITA2_FIGURES = np.array(list("\x003\n- '87\r\x054\x07,!:(5+)2#6019?&\0./=\0"))
+ITA2_FIGS = 0b11011
+ITA2_LTRS = 0b11111
+
+
+def parse_framing(name: str) -> Framing:
+    """Turn a serial framing name into its parts.
+
+    :param name: Data bits, parity (N, E or O), stop bits. Like '5N1', '7E1', '8N1'.
+    :return: Framing namedtuple
+    :raises: ValueError if name is not a framing
+    """
+    if len(name) != 3 or not name[0].isdigit() or name[1] not in 'NEO' or not name[2].isdigit():
+        raise ValueError("Not a serial framing: %s" % name)
+    framing = Framing(name, int(name[0]), name[1], int(name[2]))
+    if not 5 <= framing.data_bits <= 8 or framing.stop_bits not in (1, 2):
+        raise ValueError("Unsupported serial framing: %s" % name)
+    return framing
+
+
+def frame_length(framing: Framing) -> int:
+    """Bits per character: start bit, data, parity, stop bits."""
+    return 1 + framing.data_bits + (framing.parity != 'N') + framing.stop_bits
+
+
+def _valid_frames(s: np.ndarray, framing: Framing) -> np.ndarray:
+    """Whether a frame starting at each position of the stream, and at the end, has good start, stop and parity
+    bits. Checked for every position at once."""
+    length = frame_length(framing)
+    m = max(len(s) - length + 1, 0)  # number of positions where a whole frame fits
+    valid = s[:m] == 0
+    for j in range(length - framing.stop_bits, length):
+        valid &= s[j:j + m] == 1
+    if framing.parity != 'N':
+        ones = np.concatenate(([0], np.cumsum(s == 1)))
+        n_ones = ones[2 + framing.data_bits:2 + framing.data_bits + m] - ones[1:1 + m]  # data and parity bits
+        valid &= n_ones % 2 == (framing.parity == 'O')
+    return np.concatenate((valid, np.zeros(len(s) + 1 - m, dtype=bool)))
+
+
+def _links(s: np.ndarray, length: int) -> tuple:
+    """Where a UART goes next from each position of the stream, with len(s) meaning the end.
+
+    :return: Tuple of (next start bit at or after each position, start of the frame after one starting there).
+    """
+    n = len(s)
+    positions = np.arange(n + 1)
+    next_zero = np.minimum.accumulate(np.where(s == 0, positions[:n], n)[::-1])[::-1]
+    next_zero = np.append(next_zero, n)
+    jump = next_zero[np.minimum(positions + length, n)]
+    jump[max(n - length + 1, 0):] = n  # frames that do not fit end the chain
+    return next_zero, jump
+
+
+def score_offsets(stream: np.ndarray, framing: Framing, n_frames: int = 20) -> np.ndarray:
+    """Score each possible alignment within the first frame length of the stream. From each offset, frames are
+    followed like a UART would (see frame_starts()), all offsets at once, and the score is the fraction of the
+    first n_frames frames that have good start, stop and parity bits.
+
+    :param stream: Array of bits, e.g. Bitstream.stream
+    :param framing: Framing from parse_framing()
+    :param n_frames: How many frames to check from each offset
+    :return: Array of frame_length() scores, 0 to 1
+    """
+    s = np.asarray(stream)
+    length = frame_length(framing)
+    valid = _valid_frames(s, framing)
+    next_zero, jump = _links(s, length)
+    positions = next_zero[np.minimum(np.arange(length), len(s))]
+    n_valid = np.zeros(length)
+    for _ in range(n_frames):  # one step per frame, for all offsets together
+        n_valid += valid[positions]
+        positions = jump[positions]
+    return n_valid / n_frames
+
+
+def detect_framing(stream: np.ndarray, framings: collections.abc.Iterable = ('5N1', '7E1', '8N1'),
+                   n_frames: int = 100) -> tuple:
+    """Guess which framing and alignment a bitstream uses. Where framings score the same, the one that checks more
+    bits per frame (parity, more stop bits) wins.
+
+    :param stream: Array of bits, e.g. Bitstream.stream
+    :param framings: Names of framings to try
+    :param n_frames: How many frames to check, see score_offsets()
+    :return: Tuple of (Framing, best offset, its score).
+    """
+    results = []
+    for name in framings:
+        framing = parse_framing(name)
+        scores = score_offsets(stream, framing, n_frames)
+        checked_bits = 1 + (framing.parity != 'N') + framing.stop_bits
+        results.append((scores.max(), checked_bits, framing, int(scores.argmax())))
+    score, _, framing, offset = max(results, key=lambda r: r[:2])
+    return framing, offset, score
+
+
+def _first_start(stream: np.ndarray, framing: Framing, n_sync_frames: int) -> int:
+    """Position of the first start bit, from the best scoring offset of a prefix of the stream."""
+    s = np.asarray(stream)
+    offset = int(score_offsets(s[:n_sync_frames * frame_length(framing)], framing, n_sync_frames).argmax())
+    zeros = np.flatnonzero(s[offset:] == 0)
+    return offset + int(zeros[0]) if len(zeros) else len(s)
+
+
+def frame_starts(stream: np.ndarray, framing: Framing, first: int) -> np.ndarray:
+    """Find start bits like a UART does: after each frame, the next start bit is the next 0, however long the idle
+    (1) gap before it. The chain of frames is followed by pointer doubling, so there are only log2(number of frames)
+    steps in Python.
+
+    :param stream: Array of bits
+    :param framing: Framing from parse_framing()
+    :param first: Position of the first start bit
+    :return: Positions of start bits. The last frame may not fit in the stream.
+    """
+    s = np.asarray(stream)
+    n = len(s)
+    if first >= n:
+        return np.zeros(0, dtype=np.int64)
+    _, jump = _links(s, frame_length(framing))
+    chain = np.array([first])
+    while chain[-1] != n:
+        # chain holds the first 2 ** k frames in order, and jump skips 2 ** k frames
+        chain = np.concatenate((chain, jump[chain]))
+        jump = jump[jump]
+    return chain[chain < n]
+
+
+def decode_frames(stream: np.ndarray, framing: Framing, first: int = None, n_sync_frames: int = 20) -> Frames:
+    """Split a bitstream into UART frames and take out each character's code.
+
+    Example:
+    decode_frames(b.stream, parse_framing('5N1')).codes -> [31 16 20 1 ...]
+
+    :param stream: Array of bits, e.g. Bitstream.stream. Values other than 0 and 1 are neither start nor stop bits,
+        and count as 0 in data.
+    :param framing: Framing from parse_framing()
+    :param first: Position of the first start bit. `None` to align with score_offsets() of the first n_sync_frames.
+    :param n_sync_frames: How many frames of the stream to use for alignment
+    :return: Frames namedtuple of arrays: start bit positions, codes (first data bit is least significant), and
+        whether each frame has bad stop bits or bad parity. Only whole frames are included.
+    """
+    s = np.asarray(stream)
+    if first is None:
+        first = _first_start(s, framing, n_sync_frames)
+    return _frames_at(s, framing, frame_starts(s, framing, first))
+
+
+def _frames_at(s: np.ndarray, framing: Framing, starts: np.ndarray) -> Frames:
+    """Take out the codes and errors of the whole frames at the given start bits."""
+    length = frame_length(framing)
+    starts = starts[starts + length <= len(s)]
+    bits = s[starts[:, np.newaxis] + np.arange(length)] == 1
+    data = bits[:, 1:1 + framing.data_bits]
+    codes = data @ (1 << np.arange(framing.data_bits))
+    framing_errors = ~bits[:, length - framing.stop_bits:].all(axis=1)
+    if framing.parity == 'N':
+        parity_errors = np.zeros(len(starts), dtype=bool)
+    else:
+        n_ones = data.sum(axis=1) + bits[:, 1 + framing.data_bits]
+        parity_errors = n_ones % 2 != (framing.parity == 'O')
+    return Frames(starts, codes, framing_errors, parity_errors)
+
+
+def ita2_to_text(codes: np.ndarray, figures: bool = False) -> tuple:
+    """Decode ITA2 ("Baudot") codes, following LTRS and FIGS shifts.
+
+    :param codes: Array of 5-bit codes
+    :param figures: Whether the figures shift is in effect before the first code
+    :return: Tuple of (text, whether the figures shift is in effect after the last code).
+    """
+    codes = np.asarray(codes, dtype=int)
+    is_shift = (codes == ITA2_FIGS) | (codes == ITA2_LTRS)
+    last_shift = np.maximum.accumulate(np.where(is_shift, np.arange(len(codes)), -1))
+    in_figures = np.where(last_shift >= 0, codes[last_shift] == ITA2_FIGS, figures)
+    chars = np.where(in_figures, ITA2_FIGURES[codes], ITA2_LETTERS[codes])
+    text = ''.join(chars[~is_shift])
+    return text, bool(in_figures[-1]) if len(codes) else figures
+
+
+def encode_frames(codes: np.ndarray, framing: Framing, gaps: np.ndarray = None) -> np.ndarray:
+    """Make the bitstream a UART would send. The inverse of decode_frames().
+
+    :param codes: Array of character codes
+    :param framing: Framing from parse_framing()
+    :param gaps: Number of idle (1) bits before each frame. `None` for back-to-back frames.
+    :return: Array of bits
+    """
+    codes = np.asarray(codes, dtype=int)
+    data = (codes[:, np.newaxis] >> np.arange(framing.data_bits)) & 1
+    columns = [np.zeros((len(codes), 1), dtype=int), data]
+    if framing.parity != 'N':
+        columns.append((data.sum(axis=1, keepdims=True) + (framing.parity == 'O')) % 2)
+    columns.append(np.ones((len(codes), framing.stop_bits), dtype=int))
+    frames = np.hstack(columns)
+    if gaps is None:
+        return frames.ravel()
+    lengths = frame_length(framing) + np.asarray(gaps)
+    bits = np.ones(lengths.sum(), dtype=int)
+    starts = np.cumsum(lengths) - frame_length(framing)
+    bits[starts[:, np.newaxis] + np.arange(frame_length(framing))] = frames
+    return bits
+
+
+def ascii_to_text(codes: np.ndarray) -> str:
+    """Decode ASCII (or for 8 data bits, Latin-1) codes. Control characters are kept."""
+    return np.asarray(codes, dtype=np.uint8).tobytes().decode('latin-1')
+
+
+class UartDecoder:
+    def __init__(self, framing: str = '5N1', n_sync_frames: int = 20) -> None:
+        """Decode UART frames from bits as they arrive, in chunks of any size. Gives the same frames and text as
+        decode_frames() on the whole stream.
+
+        Example:
+        U = UartDecoder('5N1')
+        for bits in stream_pipeline('long.wav'):
+            frames, text = U.feed(bits)
+        frames, text = U.flush()
+
+        :param framing: Framing name, like '5N1', '7E1', '8N1'. 5 data bits are ITA2, otherwise ASCII.
+        :param n_sync_frames: How many frames of bits to collect before choosing the alignment
+        """
+        self.framing = parse_framing(framing)
+        self.n_sync_frames = n_sync_frames
+        self.pending = np.zeros(0, dtype=int)  # bits after the last whole frame
+        self.position = 0  # stream position of pending[0]
+        self.synced = False
+        self.figures = False
+        self.n_frames = 0
+        self.n_framing_errors = 0
+        self.n_parity_errors = 0
+
+    def feed(self, bits: np.ndarray, final: bool = False) -> tuple:
+        """Decode whatever whole frames are available.
+
+        :param bits: Next chunk of the bitstream
+        :param final: True if no more bits will come, so alignment must be chosen now
+        :return: Tuple of (Frames with start positions counted from the beginning of the stream, decoded text).
+        """
+        s = np.concatenate((self.pending, np.asarray(bits)))
+        length = frame_length(self.framing)
+        if not self.synced:
+            if len(s) < self.n_sync_frames * length and not final:
+                self.pending = s
+                return _frames_at(s, self.framing, np.zeros(0, dtype=np.int64)), ''
+            first = _first_start(s, self.framing, self.n_sync_frames)
+            self.synced = True
+        else:
+            zeros = np.flatnonzero(s == 0)  # pending always begins at the next start bit or idle
+            first = int(zeros[0]) if len(zeros) else len(s)
+        starts = frame_starts(s, self.framing, first)
+        frames = _frames_at(s, self.framing, starts)
+        resume = starts[len(frames.starts)] if len(starts) > len(frames.starts) else len(s)
+        self.pending = s[resume:]
+        frames = frames._replace(starts=frames.starts + self.position)
+        self.position += resume
+        self.n_frames += len(frames.starts)
+        self.n_framing_errors += int(np.count_nonzero(frames.framing_errors))
+        self.n_parity_errors += int(np.count_nonzero(frames.parity_errors))
+        if self.framing.data_bits == 5:
+            text, self.figures = ita2_to_text(frames.codes, self.figures)
+        else:
+            text = ascii_to_text(frames.codes)
+        return frames, text
+
+    def flush(self) -> tuple:
+        """Decode the remaining whole frames at the end of the stream. Same return as feed()."""
+        return self.feed(np.zeros(0, dtype=int), final=True)